@@ -0,0 +1,74 @@
+"""
+ASGI entry point for the meeting assistant:
+
+    uvicorn src.asgi:app --host 0.0.0.0 --port 5000
+
+Serves the same /receive and /metrics endpoints as the Flask app, but the
+whole pipeline runs on the server's event loop, so many in-flight requests
+share one loop while they wait on the LLM and Calendar APIs.
+"""
+import json
+from src.llm import warm_up
+from src.main import DEBUG, handle_meeting_request
+from src.metrics import render_metrics
+from src.output import iter_output_json
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _respond(send, status: int, body: bytes, content_type: str):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode()),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _respond_json(send, status: int, payload):
+    await _respond(send, status, json.dumps(payload).encode(), "application/json")
+
+
+async def _respond_stream(send, status: int, chunks, content_type: str):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode())]})
+    for chunk in chunks:
+        await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await warm_up()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    method, path = scope["method"], scope["path"]
+    if path == "/metrics" and method == "GET":
+        await _respond(send, 200, render_metrics().encode(), "text/plain; version=0.0.4")
+    elif path == "/receive" and method == "POST":
+        try:
+            data = json.loads(await _read_body(receive))
+        except ValueError:
+            await _respond_json(send, 400, {"error": "Request body must be JSON"})
+            return
+        if DEBUG:
+            print(f"\n Received: {json.dumps(data, indent=2)}")
+        result = await handle_meeting_request(data)
+        await _respond_stream(send, 200, iter_output_json(result), "application/json")
+    elif path in ("/metrics", "/receive"):
+        await _respond_json(send, 405, {"error": "Method not allowed"})
+    else:
+        await _respond_json(send, 404, {"error": "Not found"})
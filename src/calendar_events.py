@@ -1,32 +1,107 @@
 from src.classes import Event
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
+import httplib2
+import math
+import os
+import threading
+from src.event_store import EventStore
+from src.metrics import CALENDAR_FETCH_SECONDS
 
 KEYS_PATH = Path("./keys")
+# Point at a local fake Calendar server to measure fetching offline
+CALENDAR_API_ENDPOINT = os.environ.get("CALENDAR_API_ENDPOINT")
+FETCH_WORKERS = int(os.environ.get("CALENDAR_FETCH_WORKERS", "8"))
+FETCH_TIMEOUT_SECS = float(os.environ.get("CALENDAR_FETCH_TIMEOUT_SECS", "10"))
 
-def get_all_calendar_events(users: list[str], start_date: str, end_date: str) -> list[Event]:
+_event_store = None
+_event_store_lock = threading.Lock()
+
+def get_event_store() -> EventStore:
+    """Opens the local event store on first use, once across fetch threads."""
+    global _event_store
+    if _event_store is None:
+        with _event_store_lock:
+            if _event_store is None:
+                _event_store = EventStore()
+    return _event_store
+
+def get_all_calendar_events(users: list[str], start_date: str, end_date: str,
+                            max_workers: int = FETCH_WORKERS,
+                            timeout: float = FETCH_TIMEOUT_SECS) -> list[Event]:
+    """
+    Fetches every user's events concurrently on a bounded thread pool.
+    Each user gets `timeout` seconds for their whole fetch, however many
+    pages or slow reads it takes; with more users than workers, the wait
+    grows by `timeout` per extra round of fetches. A user whose fetch
+    fails or is still running at the deadline is reported and skipped,
+    and the others are still returned.
+    Events are merged in the order of `users`, whatever order fetches finish in.
+    A meeting on several users' calendars, whoever organised it, is kept
+    once, from the first of them.
+    """
+    if not users:
+        return []
+    workers = min(max_workers, len(users))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(get_created_events, user, start_date, end_date, timeout)
+                   for user in users]
+        wait(futures, timeout=timeout * math.ceil(len(users) / workers))
+    finally:
+        # Late fetches are left to finish in the background, unawaited
+        executor.shutdown(wait=False, cancel_futures=True)
     events_list = []
-    for user in users:
-        events_list.extend(get_created_events(user, start_date, end_date))
+    seen_ids = set()
+    for user, future in zip(users, futures):
+        if not future.done() or future.cancelled():
+            print(f"Skipping calendar of {user}, fetch missed the {timeout}s deadline")
+            continue
+        try:
+            user_events = future.result()
+        except Exception as e:
+            print(f"Skipping calendar of {user}, fetch failed: {e!r}")
+            continue
+        for event in user_events:
+            if event.event_id is not None:
+                if event.event_id in seen_ids:
+                    continue
+                seen_ids.add(event.event_id)
+            events_list.append(event)
     return events_list
 
 
-def get_created_events(user: str, start: str, end: str) -> list[Event]:
+def get_created_events(user: str, start: str, end: str,
+                       timeout: float = FETCH_TIMEOUT_SECS) -> list[Event]:
+    with CALENDAR_FETCH_SECONDS.time():
+        return _get_created_events(user, start, end, timeout)
+
+
+def _get_created_events(user: str, start: str, end: str, timeout: float) -> list[Event]:
 
     events_list = []
     token_path = KEYS_PATH / (user.split("@")[0]+".token")
     user_creds = Credentials.from_authorized_user_file(token_path)
-    calendar_service = build("calendar", "v3", credentials=user_creds)
-    events_result = calendar_service.events().list(calendarId='primary', timeMin=start,timeMax=end,singleEvents=True,orderBy='startTime').execute()
-    events = events_result.get('items')
+    # Own Http per call: httplib2 connections are not thread safe
+    authorized_http = AuthorizedHttp(user_creds, http=httplib2.Http(timeout=timeout))
+    client_options = {"api_endpoint": CALENDAR_API_ENDPOINT} if CALENDAR_API_ENDPOINT else None
+    calendar_service = build("calendar", "v3", http=authorized_http,
+                             client_options=client_options, cache_discovery=False)
+    event_store = get_event_store()
+    sync_user_calendar(calendar_service, user, event_store)
+    # Fetch windows start at the current time, so ended items are never read again
+    event_store.prune(user, start)
+    events = event_store.get_items(user, start, end)
     
     for event in events : 
-        # creator
+        # creator; events organised by someone else are kept too, as they
+        # take up the user's time all the same
         creator = event["creator"]["email"]
-        if creator != user:
-            continue
 
         # attendees
         attendee_list = []
@@ -44,11 +119,49 @@ def get_created_events(user: str, start: str, end: str) -> list[Event]:
         # summary
         summary = event["summary"]
 
-        event_obj = Event(creator, start_time, end_time, summary, attendee_list)
+        event_obj = Event(creator, start_time, end_time, summary, attendee_list,
+                          event_id=event.get("id"), etag=event.get("etag"))
         events_list.append(event_obj)
 
     return events_list
 
+def sync_user_calendar(calendar_service, user: str, event_store: EventStore):
+    """
+    Brings the user's stored events up to date. With a saved sync token only
+    the changes since the last sync are listed; without one, or once Calendar
+    rejects the token as expired (HTTP 410), the whole calendar is re-listed.
+    """
+    sync_token = event_store.get_sync_token(user)
+    if sync_token:
+        try:
+            items, next_sync_token = list_all_events(calendar_service, syncToken=sync_token)
+            event_store.apply_items(user, items, next_sync_token)
+            return
+        except HttpError as e:
+            if e.resp.status != 410:
+                raise
+            print(f"Sync token for {user} expired, running a full sync")
+    items, next_sync_token = list_all_events(calendar_service)
+    event_store.apply_items(user, items, next_sync_token, full_sync=True)
+
+
+def list_all_events(calendar_service, **params) -> tuple[list, str]:
+    """
+    Lists every page of the primary calendar. Returns the items and the sync
+    token Calendar hands out with the last page.
+    """
+    items = []
+    page_token = None
+    while True:
+        result = calendar_service.events().list(calendarId='primary', singleEvents=True,
+                                                showDeleted=True, maxResults=2500,
+                                                pageToken=page_token, **params).execute()
+        items.extend(result.get('items', []))
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return items, result.get('nextSyncToken')
+
+
 def get_all_calendar_events_dummy(ind=0) -> list[Event]:
     test_cases = []
 
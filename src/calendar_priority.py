@@ -1,25 +1,53 @@
-from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
-import os
 from pydantic_ai import Agent
 import asyncio
+from src.priority_cache import PriorityCache
+from src.priority_rules import apply_rules
+from src.metrics import PRIORITY_RULE_HITS, STAGE_SECONDS
+from src.event_loop import run_sync
+from src.llm import model
+import os
+
+# Events per LLM request, requests in flight at once, and retries per chunk
+CHUNK_SIZE = int(os.environ.get("PRIORITY_CHUNK_SIZE", "20"))
+CONCURRENCY = int(os.environ.get("PRIORITY_CONCURRENCY", "4"))
+RETRIES = int(os.environ.get("PRIORITY_RETRIES", "1"))
+VALID_PRIORITIES = {1.0, 2.0, 3.0, 4.0}
+DEFAULT_PRIORITY = 3.0
+
+priority_agent = Agent(
+    model=model,
+    system_prompt="""You are an expert at analyzing calendar events and assigning priority levels.
+
+Based on the event summary, assign one of these priority levels:
+1 = FIXED (unchangeable events like appointments, deadlines, client meetings)
+2 = URGENT (time-sensitive but can be slightly adjusted if needed)
+3 = IMPORTANT (significant events but with some scheduling flexibility like team meetings)
+4 = FLEXIBLE (can be easily rescheduled or moved)
 
-# Use the same environment variables and provider setup
-os.environ["BASE_URL"] = "http://localhost:8000/v1"
-os.environ["OPENAI_API_KEY"] = "abc-123"
+Consider factors like:
+- Keywords indicating urgency (deadline, urgent, critical, emergency)
+- Meeting types (client meetings, interviews = more fixed)
+- Team activities (team meetings, discussions = more flexible)
+- Personal vs professional context
 
-# Create OpenAI-compatible provider
-provider = OpenAIProvider(
-    base_url=os.environ["BASE_URL"],
-    api_key=os.environ["OPENAI_API_KEY"],
+Return ONLY the numbers (1, 2, 3, or 4) separated by commas, nothing else.
+Example output: 2, 3, 1, 4"""
 )
 
-# Reference the same model as your existing agent
-priority_agent_model = OpenAIModel("llama3-70b", provider=provider)
+_priority_cache = None
+
+def get_priority_cache() -> PriorityCache:
+    """Opens the on-disk priority cache on first use."""
+    global _priority_cache
+    if _priority_cache is None:
+        _priority_cache = PriorityCache()
+    return _priority_cache
 
 async def set_event_priorities(events: list) -> list:
     """
-    Use LLM to analyze event summaries and set priority levels.
+    Set priority levels. Summaries the keyword rules classify confidently
+    are settled locally; the rest are taken from the priority cache where
+    possible, and only the cache misses go to the LLM, in one batch.
     Modifies the events in place and returns the updated list.
     
     Args:
@@ -28,64 +56,86 @@ async def set_event_priorities(events: list) -> list:
     Returns:
         List of Event objects with updated priorities
     """
-    
+    if not events:
+        return events
+
+    unresolved = apply_rules(events)
+    PRIORITY_RULE_HITS.inc(len(events) - len(unresolved))
+    if not unresolved:
+        return events
+
+    cache = get_priority_cache()
+    uncached = []
+    for event, priority in zip(unresolved, cache.get_many(unresolved)):
+        if priority is None:
+            uncached.append(event)
+        else:
+            event.priority = priority
+
+    if uncached:
+        classified = await classify_event_priorities(uncached)
+        cache.put_many(classified)
+    return events
+
+async def classify_event_priorities(events: list) -> list:
+    """
+    Use LLM to analyze event summaries and set priority levels.
+    Events are sent in chunks of CHUNK_SIZE, at most CONCURRENCY chunks at
+    a time, so a bad reply only affects its own chunk, which is retried up
+    to RETRIES times. Events in a chunk that still fails get the default
+    priority. Modifies the events in place and returns the events whose
+    priority came from the LLM, as opposed to the fallback default.
+    """
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    chunks = [events[i:i + CHUNK_SIZE] for i in range(0, len(events), CHUNK_SIZE)]
+    results = await asyncio.gather(*(classify_chunk(chunk, semaphore) for chunk in chunks))
+    return [event for classified in results for event in classified]
+
+def parse_priorities(content: str, expected: int) -> list:
+    """
+    Parses a comma-separated reply, raising ValueError unless it holds
+    exactly `expected` priorities, each 1-4.
+    """
+    priorities = [float(p.strip()) for p in content.strip().split(',')]
+    if len(priorities) != expected:
+        raise ValueError(f"expected {expected} priorities, got {len(priorities)}")
+    if any(p not in VALID_PRIORITIES for p in priorities):
+        raise ValueError(f"priorities out of range: {content.strip()}")
+    return priorities
+
+async def classify_chunk(events: list, semaphore: asyncio.Semaphore) -> list:
     # Extract summaries for LLM analysis
     summaries = []
     for i, event in enumerate(events):
         summaries.append(f"Event {i+1}: {event.summary}")
     summaries_text = "\n".join(summaries)
     
-    # Create agent with priority classification system prompt
-    priority_agent = Agent(
-        model=priority_agent_model,
-        system_prompt="""You are an expert at analyzing calendar events and assigning priority levels.
-
-Based on the event summary, assign one of these priority levels:
-1 = FIXED (unchangeable events like appointments, deadlines, client meetings)
-2 = URGENT (time-sensitive but can be slightly adjusted if needed)
-3 = IMPORTANT (significant events but with some scheduling flexibility like team meetings)
-4 = FLEXIBLE (can be easily rescheduled or moved)
-
-Consider factors like:
-- Keywords indicating urgency (deadline, urgent, critical, emergency)
-- Meeting types (client meetings, interviews = more fixed)
-- Team activities (team meetings, discussions = more flexible)
-- Personal vs professional context
-
-Return ONLY the numbers (1, 2, 3, or 4) separated by commas, nothing else.
-Example output: 2, 3, 1, 4"""
-    )
-    
     # Create user prompt
-    user_prompt = f"""Analyze these event summaries and assign priority levels:
+    user_prompt = f"""Analyze these {len(events)} event summaries and assign priority levels:
 {summaries_text}
 
-Return only the priority numbers separated by commas."""
+Return exactly {len(events)} priority numbers separated by commas."""
     
-    try:
-        # Run the agent
-        result = await priority_agent.run(user_prompt)
-        content = result.output.strip()
-        
-        # Parse the comma-separated priorities
-        priority_strings = content.split(',')
-        priorities = [float(p.strip()) for p in priority_strings]
-        
+    for attempt in range(RETRIES + 1):
+        try:
+            # Run the agent
+            async with semaphore:
+                with STAGE_SECONDS.time("priority_llm"):
+                    result = await priority_agent.run(user_prompt)
+            priorities = parse_priorities(result.output, len(events))
+        except Exception as e:
+            print(f"Error setting priorities (attempt {attempt + 1}): {e}")
+            continue
+
         # Update event objects with new priorities
-        for i, event in enumerate(events):
-            if i < len(priorities):
-                event.priority = priorities[i]
-            else:
-                # Fallback if LLM didn't return enough priorities
-                event.priority = 3.0  # Default to IMPORTANT
-                
-        return events
-        
-    except Exception as e:
-        print(f"Error setting priorities: {e}")
-        # Return events with default priorities unchanged
+        for event, priority in zip(events, priorities):
+            event.priority = priority
         return events
 
+    for event in events:
+        event.priority = DEFAULT_PRIORITY  # Default to IMPORTANT
+    return []
+
 # Example usage function (similar to your existing pattern)
 async def process_priority_request(events_list):
     """Process priority request and return updated events"""
@@ -95,4 +145,4 @@ async def process_priority_request(events_list):
 # If you need to run this synchronously, you can use:
 def set_event_priorities_sync(events: list) -> list:
     """Synchronous wrapper for the async priority setting function"""
-    return asyncio.run(set_event_priorities(events))
\ No newline at end of file
+    return run_sync(set_event_priorities(events))
\ No newline at end of file
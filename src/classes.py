@@ -1,26 +1,102 @@
-from datetime import datetime, time
+from datetime import datetime, tzinfo
+
+
+def to_epoch(value: datetime) -> int:
+    return int(value.timestamp())
+
+
+def from_epoch(seconds: int, tz: tzinfo = None) -> datetime:
+    # Naive events (tz None) come back as naive local time, as they went in
+    return datetime.fromtimestamp(seconds, tz)
+
 
 class Event:
+    """
+    A calendar event. Times are kept as integer unix seconds, with the
+    timezone of the start time kept alongside so datetimes can be rebuilt
+    in the event's own zone when they are read. Window and final times are
+    None until something sets them.
+    """
+    __slots__ = ("event_id", "etag", "creator", "start_ts", "end_ts", "tz", "summary",
+                 "attendees", "priority", "window_start_ts", "window_end_ts",
+                 "final_start_ts", "final_end_ts")
+
     def __init__(self, creator: str,start_time: datetime, end_time: datetime,
-                 summary: str, attendees: list[str], priority=None):
-        
+                 summary: str, attendees: list[str], priority=None, event_id: str = None,
+                 etag: str = None):
+
         # Fields initialized at the creation of the event
+        # Google Calendar id and etag, if the event came from there
+        self.event_id = event_id
+        self.etag = etag
         self.creator = creator
-        self.start_time = start_time
-        self.end_time = end_time
+        self.tz = start_time.tzinfo
+        self.start_ts = to_epoch(start_time)
+        self.end_ts = to_epoch(end_time)
         self.summary = summary
         self.attendees = attendees
 
-        # Fields initialized later in the pipeline, for now set to default values
-        curr_time = datetime.now()
+        # Fields initialized later in the pipeline
         if priority:
             self.priority = priority
         else:
             self.priority: float = 0.0
-        self.window_start_time: datetime = datetime.combine(curr_time.date(), time(9, 0)) 
-        self.window_end_time: datetime = datetime.combine(curr_time.date(), time(17, 0))
-        self.final_start_time: datetime = curr_time
-        self.final_end_time: datetime = curr_time
+        self.window_start_ts = None
+        self.window_end_ts = None
+        self.final_start_ts = None
+        self.final_end_ts = None
+
+    def _datetime(self, seconds):
+        return None if seconds is None else from_epoch(seconds, self.tz)
+
+    @property
+    def start_time(self) -> datetime:
+        return from_epoch(self.start_ts, self.tz)
+
+    @start_time.setter
+    def start_time(self, value: datetime):
+        self.tz = value.tzinfo
+        self.start_ts = to_epoch(value)
+
+    @property
+    def end_time(self) -> datetime:
+        return from_epoch(self.end_ts, self.tz)
+
+    @end_time.setter
+    def end_time(self, value: datetime):
+        self.end_ts = to_epoch(value)
+
+    @property
+    def window_start_time(self) -> datetime:
+        return self._datetime(self.window_start_ts)
+
+    @window_start_time.setter
+    def window_start_time(self, value: datetime):
+        self.window_start_ts = None if value is None else to_epoch(value)
+
+    @property
+    def window_end_time(self) -> datetime:
+        return self._datetime(self.window_end_ts)
+
+    @window_end_time.setter
+    def window_end_time(self, value: datetime):
+        self.window_end_ts = None if value is None else to_epoch(value)
+
+    @property
+    def final_start_time(self) -> datetime:
+        return self._datetime(self.final_start_ts)
+
+    @final_start_time.setter
+    def final_start_time(self, value: datetime):
+        self.final_start_ts = None if value is None else to_epoch(value)
+
+    @property
+    def final_end_time(self) -> datetime:
+        return self._datetime(self.final_end_ts)
+
+    @final_end_time.setter
+    def final_end_time(self, value: datetime):
+        self.final_end_ts = None if value is None else to_epoch(value)
 
     def to_dict(self):
         return {
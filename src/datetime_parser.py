@@ -0,0 +1,227 @@
+"""
+Local parser for the common ways a meeting request says when it happens:
+"tomorrow morning", "Tuesday at 4 pm", "on the 17th", "Jan 5 from 3-4:30pm",
+"for 30 minutes". It follows the conventions of the parser agent's prompt
+and of calculate_meeting_times, and gives up (returns None) whenever the
+text is ambiguous so the request can go to the LLM instead.
+"""
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+DEFAULT_DURATION = timedelta(hours=1)
+DEFAULT_HOUR = 9
+PARTS_OF_DAY = {"morning": 9, "afternoon": 14, "evening": 18, "tonight": 18}
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = {name: number for number, names in enumerate(
+    [("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+     ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+     ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"),
+     ("december", "dec")], start=1) for name in names}
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4,
+                "fifteen": 15, "twenty": 20, "thirty": 30, "forty-five": 45, "ninety": 90}
+
+_month = "(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?"
+_ordinal = r"(\d{1,2})(?:st|nd|rd|th)?"
+_meridiem = r"(a\.?m\.?|p\.?m\.?)(?![a-z])"
+_clock = r"(\d{1,2})(?::([0-5]\d))?"
+_amount = r"(\d+(?:\.\d+)?|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + ")"
+
+# Phrases that name a time too loosely to pin down without the LLM
+VAGUE = re.compile(r"\b(next week|this week|next month|weekend|sometime|some time|"
+                   r"midnight|end of (the )?(day|week|month)|eod|asap|"
+                   r"before|after|around|between|earliest|latest)\b|\bby \d|"
+                   r"\d\s*([ap]\.?m\.?)?\s+or\s+\d")
+
+
+class _Text:
+    """Lowercased text that blanks out each match so it is read only once."""
+    def __init__(self, text: str):
+        self.text = " " + text.lower() + " "
+
+    def take(self, pattern: str) -> List[re.Match]:
+        matches = list(re.finditer(pattern, self.text))
+        for match in matches:
+            self.text = (self.text[:match.start()] + " " * (match.end() - match.start())
+                         + self.text[match.end():])
+        return matches
+
+
+def _hour_24(hour: int, minute: int, meridiem: Optional[str]) -> Optional[Tuple[int, int]]:
+    if minute > 59:
+        return None
+    if meridiem is None:
+        return (hour, minute) if hour <= 23 else None
+    if not 1 <= hour <= 12:
+        return None
+    if meridiem.startswith("p"):
+        return (hour % 12 + 12, minute)
+    return (hour % 12, minute)
+
+
+def _bare_hour(hour: int, minute: int, part_of_day: Optional[str]) -> Optional[Tuple[int, int]]:
+    """A clock time given without am/pm, e.g. "at 4" or "10:30"."""
+    if hour > 23:
+        return None
+    if hour < 12 and part_of_day in ("afternoon", "evening", "tonight"):
+        return (hour + 12, minute)
+    if part_of_day is None and hour < 8:
+        # "at 4" could be either; "at 9" and "at 11" are working hours
+        return None
+    return (hour, minute)
+
+
+def _next_weekday(reference: datetime, weekday: int) -> date:
+    # Same rule as calculate_meeting_times: the same weekday means next week
+    days = (weekday - reference.weekday()) % 7 or 7
+    return (reference + timedelta(days=days)).date()
+
+
+def _calendar_date(reference: datetime, month: Optional[int], day: int) -> Optional[date]:
+    """The next month/day on or after the reference date."""
+    candidates = []
+    if month is None:
+        for offset in range(0, 3):
+            year, month_index = divmod(reference.month - 1 + offset, 12)
+            candidates.append((reference.year + year, month_index + 1))
+    else:
+        candidates = [(reference.year, month), (reference.year + 1, month)]
+    for year, month_number in candidates:
+        try:
+            found = date(year, month_number, day)
+        except ValueError:
+            continue
+        if found >= reference.date():
+            return found
+    return None
+
+
+def _parse_days(text: _Text, reference: datetime) -> Optional[set]:
+    days = set()
+    for match in text.take(r"\b(\d{4})-(\d{2})-(\d{2})\b"):
+        try:
+            days.add(date(*map(int, match.groups())))
+        except ValueError:
+            return None
+    for match in text.take(r"\b" + _month + r"\s+" + _ordinal + r"\b"):
+        days.add(_calendar_date(reference, MONTHS[match.group(1)], int(match.group(2))))
+    for match in text.take(r"\b" + _ordinal + r"\s+(?:of\s+)?" + _month + r"(?![a-z])"):
+        days.add(_calendar_date(reference, MONTHS[match.group(2)], int(match.group(1))))
+    for _ in text.take(r"\bday after tomorrow\b"):
+        days.add((reference + timedelta(days=2)).date())
+    for _ in text.take(r"\btomorrow\b"):
+        days.add((reference + timedelta(days=1)).date())
+    for _ in text.take(r"\b(today|tonight|this (morning|afternoon|evening))\b"):
+        days.add(reference.date())
+    for match in text.take(r"\bin (\d+|" + "|".join(NUMBER_WORDS) + r") days?\b"):
+        amount = match.group(1)
+        days.add((reference + timedelta(days=int(NUMBER_WORDS.get(amount, amount)))).date())
+    for match in text.take(r"\b(?:(?:next|this|coming|on)\s+)?(" + "|".join(WEEKDAYS) + r")s?\b"):
+        days.add(_next_weekday(reference, WEEKDAYS.index(match.group(1))))
+    for match in text.take(r"\b(?:on\s+)?(?:the\s+)?(\d{1,2})(?:st|nd|rd|th)\b"):
+        days.add(_calendar_date(reference, None, int(match.group(1))))
+    if None in days:
+        return None
+    return days
+
+
+def _parse_range(text: _Text) -> Optional[list]:
+    """Explicit start and end times, e.g. "3-4 pm" or "from 10am to 11:30am"."""
+    spans = []
+    for match in text.take(r"\b" + _clock + r"\s*(?:" + _meridiem + r")?\s*(?:-|–|to|until|till)\s*"
+                           + _clock + r"\s*" + _meridiem):
+        start_hour, start_minute, start_meridiem, end_hour, end_minute, end_meridiem = match.groups()
+        end = _hour_24(int(end_hour), int(end_minute or 0), end_meridiem)
+        start = _hour_24(int(start_hour), int(start_minute or 0), start_meridiem or end_meridiem)
+        if start is None or end is None:
+            return None
+        if start_meridiem is None and start > end:
+            # "11-1 pm" starts in the morning
+            start = _hour_24(int(start_hour), int(start_minute or 0), "am")
+        if start >= end:
+            return None
+        spans.append((start, end))
+    return spans
+
+
+def _parse_times(text: _Text, part_of_day: Optional[str]) -> Optional[list]:
+    times = []
+    for match in text.take(r"\b" + _clock + r"\s*" + _meridiem):
+        times.append(_hour_24(int(match.group(1)), int(match.group(2) or 0), match.group(3)))
+    for match in text.take(r"\b([01]?\d|2[0-3]):([0-5]\d)\b"):
+        times.append(_bare_hour(int(match.group(1)), int(match.group(2)), part_of_day))
+    for _ in text.take(r"\b(noon|midday)\b"):
+        times.append((12, 0))
+    for match in text.take(r"\bat\s+(\d{1,2})\b(?!\s*(%|st\b|nd\b|rd\b|th\b|\.\d))"):
+        times.append(_bare_hour(int(match.group(1)), 0, part_of_day))
+    if None in times:
+        return None
+    return times
+
+
+def _parse_duration(text: _Text) -> Optional[timedelta]:
+    total = timedelta()
+    found = False
+    for _ in text.take(r"\b(an? |one )?hour and a half\b|\b(1\.5|one and a half) hours?\b"):
+        total += timedelta(minutes=90)
+        found = True
+    for _ in text.take(r"\bhalf (an )?hour\b"):
+        total += timedelta(minutes=30)
+        found = True
+    hours = text.take(r"\b" + _amount + r"[\s-]*(hours?|hrs?)\b")
+    minutes = text.take(r"\b" + _amount + r"[\s-]*(minutes?|mins?)\b")
+    if len(hours) > 1 or len(minutes) > 1:
+        return None
+    for match in hours:
+        total += timedelta(hours=float(NUMBER_WORDS.get(match.group(1), match.group(1))))
+        found = True
+    for match in minutes:
+        total += timedelta(minutes=float(NUMBER_WORDS.get(match.group(1), match.group(1))))
+        found = True
+    if not found:
+        return DEFAULT_DURATION
+    return total if total > timedelta() else None
+
+
+def parse_meeting_time(text: str, reference: datetime) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Start and end of the meeting described in text, relative to the
+    reference datetime. Defaults match the parser agent's prompt: 09:00
+    when no time is given, morning/afternoon/evening at 09:00/14:00/18:00,
+    and one hour when no duration is given. Returns None unless exactly one
+    day and at most one time are mentioned.
+    """
+    if VAGUE.search(text.lower()):
+        return None
+    parsed = _Text(text)
+    parts = set(re.findall(r"\b(morning|afternoon|evening|tonight)\b", parsed.text))
+    if len(parts) > 1:
+        return None
+    part_of_day = next(iter(parts), None)
+
+    days = _parse_days(parsed, reference)
+    if not days or len(days) != 1:
+        return None
+    spans = _parse_range(parsed)
+    times = _parse_times(parsed, part_of_day)
+    duration = _parse_duration(parsed)
+    if spans is None or times is None or duration is None:
+        return None
+    if len(spans) + len(set(times)) > 1:
+        return None
+    # A time the patterns above did not understand, e.g. "from 10 to 11"
+    if re.search(r"\b(at|from|to|until|till)\s+\d", parsed.text):
+        return None
+
+    day = days.pop()
+    if spans:
+        (start_hour, start_minute), (end_hour, end_minute) = spans[0]
+        start = datetime(day.year, day.month, day.day, start_hour, start_minute)
+        return start, datetime(day.year, day.month, day.day, end_hour, end_minute)
+    if times:
+        hour, minute = times[0]
+    else:
+        hour, minute = PARTS_OF_DAY.get(part_of_day, DEFAULT_HOUR), 0
+    start = datetime(day.year, day.month, day.day, hour, minute)
+    return start, start + duration
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+
+class BackgroundLoop:
+    """
+    One long-lived asyncio event loop running in a daemon thread. Sync code
+    (Flask views, the *_sync wrappers) submits coroutines to it instead of
+    creating a loop per call, so every in-flight request shares the loop
+    and its pooled connections while waiting on LLM and Calendar I/O.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       name="background-event-loop", daemon=True)
+        self.thread.start()
+
+    def run(self, coro, timeout: float = None):
+        """
+        Runs a coroutine on the loop and blocks until it finishes. Must not
+        be called from the loop's own thread, which would deadlock.
+        """
+        if threading.current_thread() is self.thread:
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run() called from the loop thread; await instead")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+
+_background_loop = None
+_lock = threading.Lock()
+
+
+def get_background_loop() -> BackgroundLoop:
+    global _background_loop
+    with _lock:
+        if _background_loop is None:
+            _background_loop = BackgroundLoop()
+    return _background_loop
+
+
+def run_sync(coro, timeout: float = None):
+    """Runs a coroutine to completion on the shared background loop."""
+    return get_background_loop().run(coro, timeout)
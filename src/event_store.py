@@ -0,0 +1,96 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+EVENT_STORE_PATH = Path(os.environ.get("EVENT_STORE_PATH", "./cache/events.sqlite3"))
+
+
+def item_time_span(item: dict) -> tuple:
+    """
+    Start and end of a raw Calendar item as unix timestamps. All-day
+    events only carry a date, which is read as local midnight.
+    """
+    time_field = "dateTime" if "dateTime" in item["start"] else "date"
+    return (datetime.fromisoformat(item["start"][time_field]).timestamp(),
+            datetime.fromisoformat(item["end"][time_field]).timestamp())
+
+
+class EventStore:
+    """
+    Local SQLite copy of each user's raw Calendar items, together with the
+    sync token of their last sync. Lets a fetch apply only the changes since
+    the previous one instead of downloading the whole calendar again.
+    """
+    def __init__(self, path=EVENT_STORE_PATH):
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "user TEXT NOT NULL, event_id TEXT NOT NULL, start_ts REAL NOT NULL, "
+                "end_ts REAL NOT NULL, item TEXT NOT NULL, PRIMARY KEY (user, event_id))")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS events_user_start ON events (user, start_ts)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                "user TEXT PRIMARY KEY, sync_token TEXT, synced_at REAL NOT NULL)")
+
+    def get_sync_token(self, user: str):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT sync_token FROM sync_state WHERE user = ?", (user,)).fetchone()
+        return row[0] if row else None
+
+    def apply_items(self, user: str, items: list, sync_token, full_sync: bool = False):
+        """
+        Applies listed items for a user: cancelled items are deleted, all
+        others are upserted. A full sync first drops everything stored for
+        the user. The new sync token is saved in the same transaction.
+        """
+        upserts, deletes = [], []
+        for item in items:
+            if item.get("status") == "cancelled":
+                deletes.append((user, item["id"]))
+            else:
+                upserts.append((user, item["id"], *item_time_span(item), json.dumps(item)))
+        with self.lock, self.connection:
+            if full_sync:
+                self.connection.execute("DELETE FROM events WHERE user = ?", (user,))
+            self.connection.executemany(
+                "DELETE FROM events WHERE user = ? AND event_id = ?", deletes)
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO events (user, event_id, start_ts, end_ts, item) "
+                "VALUES (?, ?, ?, ?, ?)", upserts)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sync_state (user, sync_token, synced_at) VALUES (?, ?, ?)",
+                (user, sync_token, time.time()))
+
+    def prune(self, user: str, before: str) -> int:
+        """
+        Deletes the user's stored items that ended before `before`. A full
+        sync lists the whole calendar history, and nothing else removes
+        items once they are over. Returns how many were deleted.
+        """
+        before_ts = datetime.fromisoformat(before).timestamp()
+        with self.lock, self.connection:
+            return self.connection.execute(
+                "DELETE FROM events WHERE user = ? AND end_ts <= ?", (user, before_ts)).rowcount
+
+    def get_items(self, user: str, start: str, end: str) -> list:
+        """
+        Returns the user's stored items overlapping [start, end], ordered by
+        start time like Calendar's orderBy=startTime.
+        """
+        start_ts = datetime.fromisoformat(start).timestamp()
+        end_ts = datetime.fromisoformat(end).timestamp()
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT item FROM events WHERE user = ? AND end_ts > ? AND start_ts < ? "
+                "ORDER BY start_ts", (user, start_ts, end_ts)).fetchall()
+        return [json.loads(row[0]) for row in rows]
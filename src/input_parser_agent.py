@@ -1,17 +1,13 @@
-from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
-import os
-from pydantic_ai import Agent
-import asyncio
-from pydantic_ai.mcp import MCPServerStdio
+from pydantic_ai import Agent, RunContext
 from datetime import datetime, timedelta, time
 from typing import Dict
-from datetime import datetime
 from pydantic_ai import Tool  
-import nest_asyncio
 from src.classes import Event
+from src.calendar_priority import set_event_priorities
+from src.datetime_parser import parse_meeting_time
+from src.event_loop import run_sync
+from src.llm import model
 from pydantic import BaseModel, Field
-from pydantic_ai import Agent
 from typing import Literal
 
 class MeetingSummary(BaseModel):
@@ -20,28 +16,6 @@ class MeetingSummary(BaseModel):
     SUMMARY: str = Field(description="Brief meeting summary")
     PRIORITY: Literal["1", "2", "3", "4"] = Field(description="Priority level 1-4")
 
-# Set environment variables
-os.environ["BASE_URL"] = "http://localhost:8000/v1"
-os.environ["OPENAI_API_KEY"] = "abc-123"
-
-# Create OpenAI-compatible provider
-provider = OpenAIProvider(
-    base_url=os.environ["BASE_URL"],
-    api_key=os.environ["OPENAI_API_KEY"],
-)
-
-# Reference the model using the name from --served-model-name
-agent_model = OpenAIModel("llama3-70b", provider=provider)
-
-agent = Agent(
-    model=agent_model
-)
-
-async def run_async(prompt: str) -> str:
-    async with agent.run_mcp_servers():
-        result = await agent.run(prompt)
-        return result.output
-
     
 @Tool
 def calculate_meeting_times(ref_datetime_str: str, target_day: str) -> Dict[str, str]:
@@ -103,32 +77,9 @@ def calculate_meeting_times(ref_datetime_str: str, target_day: str) -> Dict[str,
     
     return result
 
-async def process_meeting_request(input_dict, agent_model):
-    """Process meeting request and return parsed meeting details"""
-    
-    
-    # Parse reference datetime
-    try:
-        reference_datetime = datetime.strptime(input_dict["Datetime"], "%d-%m-%YT%H:%M:%S")
-    except ValueError:
-        reference_datetime = datetime.fromisoformat(input_dict["Datetime"].replace('T', ' '))
-    
-    # Parse attendees
-    attendees = []
-    for attendee in input_dict["Attendees"]:
-        attendees.append(attendee["email"])
-    attendees.append(input_dict["From"])
-    
-    # Create agent with the tool
-    agent = Agent(
-        model=agent_model,
-        output_type=MeetingSummary,
-        tools=[calculate_meeting_times],  # Pass the tool here
-        system_prompt = f"""You are an expert at parsing meeting requests and calculating dates relative to a reference point.
-
-REFERENCE INFORMATION:
-- Current datetime: {reference_datetime.strftime('%Y-%m-%d %H:%M:%S')}
-- Current day: {reference_datetime.strftime('%A')}
+# Everything but the reference datetime is the same for every request, so
+# it comes first and the per-request part is appended at run time
+PARSER_SYSTEM_PROMPT = """You are an expert at parsing meeting requests and calculating dates relative to a reference point.
 
 CRITICAL TOOL USAGE RULES:
 1. When the user mentions a weekday by NAME (Monday, Tuesday, Wednesday, Thursday, Friday, Saturday, Sunday):
@@ -180,8 +131,29 @@ SUMMARY: [Brief meeting summary]
 PRIORITY: [1/2/3/4]
 
 """
-    )
-    
+
+parser_agent = Agent(
+    model=model,
+    output_type=MeetingSummary,
+    tools=[calculate_meeting_times],
+    deps_type=datetime,
+    system_prompt=PARSER_SYSTEM_PROMPT,
+)
+
+@parser_agent.system_prompt
+def reference_information(ctx: RunContext[datetime]) -> str:
+    return f"""REFERENCE INFORMATION:
+- Current datetime: {ctx.deps.strftime('%Y-%m-%d %H:%M:%S')}
+- Current day: {ctx.deps.strftime('%A')}"""
+
+def parse_reference_datetime(input_dict) -> datetime:
+    try:
+        return datetime.strptime(input_dict["Datetime"], "%d-%m-%YT%H:%M:%S")
+    except ValueError:
+        return datetime.fromisoformat(input_dict["Datetime"].replace('T', ' '))
+
+async def process_meeting_request(input_dict):
+    """Process meeting request and return parsed meeting details"""
     # Create user prompt
     user_prompt = f"""MEETING REQUEST TO PARSE:
 Subject: {input_dict["Subject"]}
@@ -190,7 +162,7 @@ Email Content: {input_dict["EmailContent"]}
 Please parse this meeting request and provide the start time, end time, summary and priority."""
     
     # Run the agent
-    result = await agent.run(user_prompt)
+    result = await parser_agent.run(user_prompt, deps=parse_reference_datetime(input_dict))
     return result.output
 
 
@@ -199,11 +171,28 @@ Please parse this meeting request and provide the start time, end time, summary
 # write code to convert prioirity to a number
 
 async def get_new_event(input_dict):
-    summary = await process_meeting_request(input_dict, agent_model)
     attendees = []
     for attendee in input_dict["Attendees"]:
         attendees.append(attendee["email"])
     attendees.append(input_dict["From"])
+
+    # Most requests say plainly when to meet; those skip the parser agent
+    # and only need a priority, which the keyword rules often settle too
+    span = parse_meeting_time(f"{input_dict['Subject']}\n{input_dict['EmailContent']}",
+                              parse_reference_datetime(input_dict))
+    if span is not None:
+        event = Event(
+            creator=input_dict["From"],
+            start_time=span[0],
+            end_time=span[1],
+            summary=input_dict["Subject"],
+            attendees=attendees,
+        )
+        await set_event_priorities([event])
+        event.priority = (event.priority or 3.0) + 0.5
+        return event
+
+    summary = await process_meeting_request(input_dict)
     event = Event(
         creator=input_dict["From"],
         start_time=datetime.strptime(summary.START_TIME, "%Y-%m-%d %H:%M:%S"),
@@ -214,12 +203,9 @@ async def get_new_event(input_dict):
     )
     return event
 
-import nest_asyncio
-import asyncio
-
-nest_asyncio.apply()
 def get_new_event_sync(input_dict):
-    loop = asyncio.get_event_loop()
-    return loop.run_until_complete(get_new_event(input_dict))
+    # Runs on the shared background loop rather than patching the caller's
+    # loop, so it also works from inside a running loop (e.g. a notebook)
+    return run_sync(get_new_event(input_dict))
 
 
@@ -0,0 +1,42 @@
+import os
+import httpx
+from pydantic_ai import Agent
+from pydantic_ai.models.openai import OpenAIModel
+from pydantic_ai.providers.openai import OpenAIProvider
+
+# Local OpenAI-compatible endpoint, e.g. vLLM started with --served-model-name
+BASE_URL = os.environ.get("BASE_URL", "http://localhost:8000/v1")
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "abc-123")
+LLM_MODEL_NAME = os.environ.get("LLM_MODEL_NAME", "llama3-70b")
+LLM_TIMEOUT_SECS = float(os.environ.get("LLM_TIMEOUT_SECS", "600"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "32"))
+
+# One keep-alive connection pool shared by every agent. Connections belong
+# to the event loop that opened them, so requests should all be served
+# from one long-lived loop (see src/event_loop.py and src/asgi.py).
+http_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(LLM_TIMEOUT_SECS, connect=5),
+    limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                        keepalive_expiry=60),
+)
+
+provider = OpenAIProvider(base_url=BASE_URL, api_key=OPENAI_API_KEY, http_client=http_client)
+
+model = OpenAIModel(LLM_MODEL_NAME, provider=provider)
+
+_warm_up_agent = Agent(model=model)
+
+
+async def warm_up() -> bool:
+    """
+    Sends one tiny prompt so the first real request finds an open connection
+    and a loaded model. Failures are logged, not raised, so the service still
+    starts while the LLM endpoint is down.
+    """
+    try:
+        await _warm_up_agent.run("Reply with OK.", model_settings={"max_tokens": 1})
+        return True
+    except Exception as e:
+        print(f"LLM warm-up failed: {e}")
+        return False
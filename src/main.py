@@ -1,22 +1,87 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request
 from threading import Thread
+from functools import partial
+from collections import OrderedDict
+import asyncio
+import hashlib
 import json
-from src.calendar_priority import set_event_priorities_sync
+import os
+import time
+from src.calendar_priority import set_event_priorities
 from src.calendar_events import get_all_calendar_events
-from src.input_parser_agent import get_new_event_sync
-from src.output import format_to_output
+from src.input_parser_agent import get_new_event
+from src.pipeline import Stage, run_stages
+from src.event_loop import run_sync
+from src.llm import warm_up
+from src.metrics import (CONFLICTS_FOUND, EVENTS_PROCESSED, RESPONSE_CACHE_HITS,
+                         STAGE_SECONDS, render_metrics)
+from src.output import format_to_output, iter_output_json
 from src.classes import Event
 from datetime import datetime, timedelta, timezone
-from src.scheduling.interval_tree import reschedule_all_meetings
+from src.scheduling.interval_tree import find_event_conflicts
+from src.scheduling.working_hours import load_working_hours
+from src.shards import ShardRegistry, shard_key
 from rich import print_json
 
 app = Flask(__name__)
 
-users = [
-    "userone.amd@gmail.com",
-    "usertwo.amd@gmail.com",
-    "userthree.amd@gmail.com"
-]
+# Schedules of each team's calendars, kept up to date across requests; a
+# request goes to the shard for its sender and attendees
+shard_registry = ShardRegistry(working_hours=load_working_hours())
+
+# Pretty-prints every request and response; too slow to leave on in production
+DEBUG = os.environ.get("MEETING_ASSISTANT_DEBUG", "") not in ("", "0")
+
+RESPONSE_CACHE_TTL_SECS = float(os.environ.get("RESPONSE_CACHE_TTL_SECS", "600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+
+
+def request_cache_key(data: dict) -> str:
+    """Request_id plus a hash of the whole payload, key order ignored."""
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{data.get('Request_id')}|{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+class ResponseCache:
+    """
+    Responses to recent /receive requests, so a client retrying a request
+    gets the same schedule back without re-running the pipeline. An
+    identical request that arrives while the first is still running waits
+    for its result. Entries expire ttl_secs after they complete; failed
+    runs are not kept. Only used from the event loop thread.
+    """
+    def __init__(self, ttl_secs: float = RESPONSE_CACHE_TTL_SECS,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl_secs = ttl_secs
+        self.max_entries = max_entries
+        # key -> [expiry time, or None while running; task]
+        self.entries = OrderedDict()
+
+    async def get_or_run(self, key: str, run):
+        entry = self.entries.get(key)
+        if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+            self.entries.move_to_end(key)
+            RESPONSE_CACHE_HITS.inc()
+            return await asyncio.shield(entry[1])
+
+        task = asyncio.ensure_future(run())
+        entry = self.entries[key] = [None, task]
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+        def finished(task):
+            if task.cancelled() or task.exception() is not None:
+                if self.entries.get(key) is entry:
+                    del self.entries[key]
+            else:
+                entry[0] = time.monotonic() + self.ttl_secs
+        task.add_done_callback(finished)
+        # Shielded so a caller that gives up does not cancel it for the others
+        return await asyncio.shield(task)
+
+
+response_cache = ResponseCache()
 
 # Dummy function to simulate getting a new event from a dict
 def get_new_event_from_dict():
@@ -32,31 +97,92 @@ def get_new_event_from_dict():
     return new_event
 
 
-def your_meeting_assistant(data): 
-    # Get new event details from the incoming dict
-    # will come from Rohit
-    new_event = get_new_event_sync(data)
+def fetch_calendar_events(users: list[str]) -> list[Event]:
     ist = timezone(timedelta(hours=5, minutes=30))
     curr_time = datetime.now(ist)
-    calender_events = get_all_calendar_events(users, curr_time.isoformat(), 
-                                                (curr_time + timedelta(weeks=1)).isoformat())
-    calender_events.append(new_event)
-    set_event_priorities_sync(calender_events)
-    # use new_event and calender_events to get scheduled events
-    scheduled_events = reschedule_all_meetings(calender_events) 
+    return get_all_calendar_events(users, curr_time.isoformat(), 
+                                   (curr_time + timedelta(weeks=1)).isoformat())
+
+
+def diff_calendar(shard, calender_events: list[Event]):
+    changes = shard.scheduler.diff(calender_events)
+    if DEBUG:
+        print(f"Calendar changes: {len(changes.added)} new, {len(changes.changed)} changed, "
+              f"{len(changes.removed)} cancelled")
+    return changes
+
+
+async def prioritize_changes(changes):
+    # Only events the resident scheduler hasn't seen need prioritizing;
+    # the new event's own priority comes from the request parser
+    await set_event_priorities(changes.added + changes.changed)
+    return changes
+
+
+def apply_changes(shard, changes):
+    shard.scheduler.apply(changes)
+    # The shard just grew or shrank, so other teams' shards may have to go
+    shard_registry.evict()
+
+
+def schedule_new_event(shard, new_event: Event, calender_events: list[Event], _applied):
+    conflicting_pairs = find_event_conflicts(calender_events + [new_event])
+    if DEBUG:
+        print(f"{len(conflicting_pairs)} conflicting event pairs across "
+              f"{len(calender_events) + 1} events before rescheduling")
+    EVENTS_PROCESSED.inc(len(calender_events) + 1)
+    CONFLICTS_FOUND.inc(len(conflicting_pairs))
+    # use new_event and the resident schedule to get scheduled events
+    return shard.scheduler.schedule_new_event(new_event)
+
+
+async def run_meeting_assistant(data):
+    # Parsing the request and fetching + prioritizing the calendars are
+    # independent, so they run side by side and join before scheduling
+    shard = shard_registry.get(shard_key(data))
+    results = await run_stages([
+        Stage("parse_request", partial(get_new_event, data)),
+        Stage("calendar_fetch", partial(fetch_calendar_events, shard.users)),
+        Stage("calendar_diff", partial(diff_calendar, shard), ["calendar_fetch"]),
+        Stage("prioritize", prioritize_changes, ["calendar_diff"]),
+        # Applying the diff does not wait for the request to be parsed
+        Stage("tree_build", partial(apply_changes, shard), ["prioritize"]),
+        Stage("reschedule", partial(schedule_new_event, shard),
+              ["parse_request", "calendar_fetch", "tree_build"]),
+    ], on_stage_done=lambda stage, secs: STAGE_SECONDS.observe(secs, stage))
     # Format the output
-    output_formatted = format_to_output(scheduled_events, data, new_event)
-    return output_formatted
+    with STAGE_SECONDS.time("format_output"):
+        return format_to_output(results["reschedule"], data, results["parse_request"])
+
+
+async def handle_meeting_request(data):
+    # Retries of a request are answered from the response cache
+    return await response_cache.get_or_run(request_cache_key(data),
+                                           lambda: run_meeting_assistant(data))
+
+
+def your_meeting_assistant(data): 
+    # Every Flask worker thread hands its request to the same long-lived loop,
+    # so requests waiting on the LLM or Calendar share it instead of each
+    # starting and tearing down a loop of its own
+    return run_sync(handle_meeting_request(data))
+
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/receive', methods=['POST'])
 def receive():
     data = request.get_json()
-    print(f"\n Received: {json.dumps(data, indent=2)}")
+    if DEBUG:
+        print(f"\n Received: {json.dumps(data, indent=2)}")
     new_data = your_meeting_assistant(data)
-    print_json(json.dumps(new_data, indent=2))
-    return jsonify(new_data)
+    if DEBUG:
+        print_json(json.dumps(new_data, indent=2))
+    return Response(iter_output_json(new_data), mimetype="application/json")
 
 if __name__ == '__main__':
+    run_sync(warm_up())
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
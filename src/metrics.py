@@ -0,0 +1,122 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from sub-millisecond tree work up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+_registry = []
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus text format, optionally split by
+    one label. p50/p99 come from histogram_quantile() on the scraper side.
+    """
+    def __init__(self, name: str, help_text: str, label_name: str = None,
+                 buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # label value -> [bucket counts..., +Inf count], sum
+        self.counts = {}
+        self.sums = {}
+        _registry.append(self)
+
+    def observe(self, value: float, label: str = None):
+        with self.lock:
+            counts = self.counts.get(label)
+            if counts is None:
+                counts = self.counts[label] = [0] * (len(self.buckets) + 1)
+                self.sums[label] = 0.0
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sums[label] += value
+
+    @contextmanager
+    def time(self, label: str = None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, label)
+
+    def _labels(self, label, extra=""):
+        parts = []
+        if self.label_name is not None:
+            parts.append(f'{self.label_name}="{label}"')
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label in sorted(self.counts, key=str):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), self.counts[label]):
+                    cumulative += count
+                    bucket_labels = self._labels(label, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{self._labels(label)} {self.sums[label]}")
+                lines.append(f"{self.name}_count{self._labels(label)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """
+    Monotonic counter in the Prometheus text format.
+    """
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        self.value = 0
+        _registry.append(self)
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render(self) -> list[str]:
+        with self.lock:
+            value = self.value
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter",
+                f"{self.name} {value}"]
+
+
+def render_metrics() -> str:
+    """
+    Every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram("meeting_assistant_stage_seconds",
+                          "Time spent in each stage of a /receive request.", "stage")
+CALENDAR_FETCH_SECONDS = Histogram("calendar_fetch_seconds",
+                                   "Time to sync and read one user's calendar, across all users.")
+EVENTS_PROCESSED = Counter("meeting_assistant_events_processed_total",
+                           "Calendar events scheduled across all requests, new events included.")
+CONFLICTS_FOUND = Counter("meeting_assistant_conflicts_found_total",
+                          "Conflicting event pairs found before rescheduling.")
+SLOTS_PROBED = Counter("scheduler_slots_probed_total",
+                       "Candidate slots checked for clashes while looking for free time.")
+NO_SLOT_FOUND = Counter("scheduler_no_slot_found_total",
+                        "Clashing events left in place because no free slot fit their window and working hours.")
+RESPONSE_CACHE_HITS = Counter("meeting_assistant_response_cache_hits_total",
+                              "/receive requests answered from, or joined to, an identical earlier request.")
+PRIORITY_RULE_HITS = Counter("priority_rule_hits_total",
+                             "Event priorities settled by the keyword rules without the cache or LLM.")
+PRIORITY_CACHE_HITS = Counter("priority_cache_hits_total",
+                              "Event priorities found in the priority cache.")
+PRIORITY_CACHE_MISSES = Counter("priority_cache_misses_total",
+                                "Event priorities missing from the priority cache and sent to the LLM.")
+SHARDS_EVICTED = Counter("meeting_assistant_shards_evicted_total",
+                         "Per-team scheduling shards dropped to stay under SHARD_MEMORY_CAP_MB.")
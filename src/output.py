@@ -1,5 +1,6 @@
 from src.classes import Event
 from datetime import datetime
+from typing import Iterator
 import json
 
 def format_to_output(events,
@@ -20,25 +21,49 @@ def format_to_output(events,
     result_dict["Duration_mins"] = str(int(duration_secs // 60))
     result_dict["MetaData"] = {}
 
+    # One record per event, shared by every attendee's timetable
     user_to_timetable: dict[str, dict] = {}
     for event in events:
-        for i in range(len(event.attendees)):
-            if event.attendees[i] == "SELF":
-                event.attendees[i] = event.creator
-        for user in event.attendees:
+        attendees = [event.creator if user == "SELF" else user for user in event.attendees]
+        record = {
+            "StartTime": event.final_start_time.isoformat(),
+            "EndTime": event.final_end_time.isoformat(),
+            "Attendees": attendees,
+            "Summary": event.summary,
+            "NumAttendees": len(attendees)
+        }
+        for user in attendees:
             if user not in user_to_timetable:
                 user_to_timetable[user] = {
                     "email": user,
                     "events": []
                 }
-
-            user_to_timetable[user]["events"].append({
-                "StartTime": event.final_start_time.isoformat(),
-                "EndTime": event.final_end_time.isoformat(),
-                "Attendees": event.attendees,
-                "Summary": event.summary,
-                "NumAttendees": len(event.attendees)
-            })
+            user_to_timetable[user]["events"].append(record)
 
     result_dict["Attendees"] = list(user_to_timetable.values())
-    return result_dict
\ No newline at end of file
+    return result_dict
+
+def iter_output_json(result: dict) -> Iterator[str]:
+    """
+    Encodes a format_to_output result as compact JSON, one chunk per
+    attendee, for a streamed response. Each shared event record is encoded
+    once and the text reused for every attendee it appears under.
+    """
+    encode = json.JSONEncoder(separators=(",", ":")).encode
+    encoded_records = {}
+
+    def encode_record(record):
+        text = encoded_records.get(id(record))
+        if text is None:
+            text = encoded_records[id(record)] = encode(record)
+        return text
+
+    fields = [f"{encode(key)}:{encode(value)}" for key, value in result.items() if key != "Attendees"]
+    yield "{" + ",".join(fields)
+    if "Attendees" in result:
+        yield (',' if fields else '') + '"Attendees":['
+        for i, timetable in enumerate(result["Attendees"]):
+            yield ((',' if i else '') + '{"email":' + encode(timetable["email"]) + ',"events":['
+                   + ",".join(encode_record(record) for record in timetable["events"]) + "]}")
+        yield "]"
+    yield "}"
@@ -0,0 +1,56 @@
+import asyncio
+import inspect
+import time
+from typing import Callable, Dict, List, Sequence
+
+
+class Stage:
+    """
+    One step of a request pipeline. `fn` receives the results of its
+    `deps`, in order, as positional arguments. Coroutine functions run on
+    the event loop; plain functions run in a worker thread so blocking I/O
+    does not hold up the other stages.
+    """
+    def __init__(self, name: str, fn: Callable, deps: Sequence[str] = ()):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+
+
+async def run_stages(stages: List[Stage],
+                     on_stage_done: Callable[[str, float], None] = None) -> Dict[str, object]:
+    """
+    Runs every stage as soon as all of its dependencies have finished and
+    returns each stage's result by name. Stages must be listed after the
+    stages they depend on. If a stage fails, the stages still running are
+    cancelled and the error is raised. on_stage_done, if given, is called
+    with each finished stage's name and its run time in seconds, not
+    counting the wait for its dependencies.
+    """
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(stage: Stage):
+        inputs = [await tasks[dep] for dep in stage.deps]
+        started = time.perf_counter()
+        if inspect.iscoroutinefunction(stage.fn):
+            result = await stage.fn(*inputs)
+        else:
+            result = await asyncio.to_thread(stage.fn, *inputs)
+        if on_stage_done is not None:
+            on_stage_done(stage.name, time.perf_counter() - started)
+        return result
+
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in tasks:
+                raise ValueError(f"Stage '{stage.name}' depends on '{dep}', "
+                                 "which is not listed before it")
+        tasks[stage.name] = asyncio.ensure_future(run(stage))
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+    return {name: task.result() for name, task in tasks.items()}
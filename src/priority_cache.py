@@ -0,0 +1,95 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from src.metrics import PRIORITY_CACHE_HITS, PRIORITY_CACHE_MISSES
+
+CACHE_PATH = Path(os.environ.get("PRIORITY_CACHE_PATH", "./cache/priorities.sqlite3"))
+MAX_ENTRIES = int(os.environ.get("PRIORITY_CACHE_MAX_ENTRIES", "10000"))
+
+
+def normalize_summary(summary: str) -> str:
+    return " ".join(summary.lower().split())
+
+
+def priority_cache_key(event) -> str:
+    """
+    Hash of the normalized summary, plus the Google event id and etag when
+    the event has them, so an edited calendar event is classified again.
+    """
+    key = hashlib.sha256(normalize_summary(event.summary).encode()).hexdigest()
+    if event.event_id:
+        key += f"|{event.event_id}|{event.etag or ''}"
+    return key
+
+
+class PriorityCache:
+    """
+    SQLite-backed cache of LLM-assigned event priorities that survives
+    restarts. Entries are evicted least recently used first once the cache
+    holds more than max_entries. Hit and miss counts are kept for the life
+    of the object.
+    """
+    def __init__(self, path=CACHE_PATH, max_entries: int = MAX_ENTRIES):
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS priorities ("
+                "key TEXT PRIMARY KEY, priority REAL NOT NULL, last_used REAL NOT NULL)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS priorities_last_used ON priorities (last_used)")
+
+    def get_many(self, events: list) -> list:
+        """
+        Returns the cached priority of each event, or None where it is missing.
+        """
+        keys = [priority_cache_key(event) for event in events]
+        found = {}
+        with self.lock:
+            unique_keys = list(set(keys))
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                chunk = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self.connection.execute(
+                    f"SELECT key, priority FROM priorities WHERE key IN ({placeholders})", chunk))
+            if found:
+                with self.connection:
+                    self.connection.executemany(
+                        "UPDATE priorities SET last_used = ? WHERE key = ?",
+                        [(time.time(), key) for key in found])
+            priorities = [found.get(key) for key in keys]
+            hits = sum(priority is not None for priority in priorities)
+            self.hits += hits
+            self.misses += len(priorities) - hits
+        PRIORITY_CACHE_HITS.inc(hits)
+        PRIORITY_CACHE_MISSES.inc(len(priorities) - hits)
+        return priorities
+
+    def put_many(self, events: list):
+        """
+        Stores each event's current priority, then evicts down to max_entries.
+        """
+        now = time.time()
+        rows = [(priority_cache_key(event), float(event.priority), now) for event in events]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO priorities (key, priority, last_used) VALUES (?, ?, ?)", rows)
+            (count,) = self.connection.execute("SELECT COUNT(*) FROM priorities").fetchone()
+            if count > self.max_entries:
+                self.connection.execute(
+                    "DELETE FROM priorities WHERE key IN "
+                    "(SELECT key FROM priorities ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
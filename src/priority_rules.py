@@ -0,0 +1,61 @@
+import os
+import re
+from typing import List, Tuple
+
+# Below this, a summary is left for the LLM to classify
+MIN_CONFIDENCE = float(os.environ.get("PRIORITY_RULE_MIN_CONFIDENCE", "0.75"))
+
+# (pattern, priority, confidence), from the heuristics in the priority
+# agent's system prompt: 1 = FIXED, 2 = URGENT, 3 = IMPORTANT, 4 = FLEXIBLE
+RULES: List[Tuple[str, float, float]] = [
+    (r"interview(s|ing)?", 1.0, 0.9),
+    (r"(client|customer)s?", 1.0, 0.85),
+    (r"(doctor|dentist|hospital|clinic|appointment|appt)s?", 1.0, 0.9),
+    (r"(deadline|due date|flight|exam|court|hearing)s?", 1.0, 0.85),
+    (r"(urgent|critical|emergency|asap|outage|incident|escalation)", 2.0, 0.9),
+    (r"(hotfix|blocker|p0|sev ?[12])", 2.0, 0.85),
+    (r"(team meeting|stand-?up|scrum|retro(spective)?|sprint|all-?hands)", 3.0, 0.85),
+    (r"(sync|1:1|one-on-one|planning|review|discussion|status update)s?", 3.0, 0.75),
+    (r"(meeting|call|catch-?up)s?", 3.0, 0.5),
+    (r"(break|lunch|coffee|tea|snack|gym|workout|walk|hike|hiking)s?", 4.0, 0.9),
+    (r"(birthday|party|social|game night|movie|dinner|drinks|personal)s?", 4.0, 0.8),
+    (r"(optional|tentative|if time|flexible)", 4.0, 0.8),
+]
+
+_compiled = [(re.compile(rf"\b{pattern}\b", re.IGNORECASE), priority, confidence)
+             for pattern, priority, confidence in RULES]
+
+
+def classify_summary(summary: str) -> Tuple[float, float]:
+    """
+    Priority and confidence in [0, 1] for an event summary. The most
+    confident matching rule wins; its confidence is halved when a rule of
+    another priority matches almost as confidently, since the summary
+    then reads both ways. Returns (3.0, 0.0) when no rule matches.
+    """
+    best = {}
+    for pattern, priority, confidence in _compiled:
+        if confidence > best.get(priority, 0.0) and pattern.search(summary or ""):
+            best[priority] = confidence
+    if not best:
+        return 3.0, 0.0
+    ranked = sorted(best.items(), key=lambda x: (-x[1], x[0]))
+    priority, confidence = ranked[0]
+    if len(ranked) > 1 and ranked[1][1] >= confidence - 0.1:
+        confidence /= 2
+    return priority, confidence
+
+
+def apply_rules(events: list, min_confidence: float = MIN_CONFIDENCE) -> list:
+    """
+    Sets the priority of every event the rules classify with at least
+    min_confidence and returns the events left over for the LLM.
+    """
+    unresolved = []
+    for event in events:
+        priority, confidence = classify_summary(event.summary)
+        if confidence >= min_confidence:
+            event.priority = priority
+        else:
+            unresolved.append(event)
+    return unresolved
@@ -0,0 +1,159 @@
+import numpy as np
+from typing import Iterator, List
+from src.scheduling.interval_tree import (ALL_ATTENDEES, Interval, IntervalTree,
+                                          IntervalTreeNode)
+
+WORD_BITS = 64
+WORD_MASK = (1 << WORD_BITS) - 1
+
+
+def mask_to_words(mask: int, words: int) -> np.ndarray:
+    """
+    Splits an attendee bitmask into uint64 words, lowest attendee ids first.
+    """
+    if mask == ALL_ATTENDEES:
+        return np.full(words, WORD_MASK, dtype=np.uint64)
+    return np.array([(mask >> (WORD_BITS * i)) & WORD_MASK for i in range(words)],
+                    dtype=np.uint64)
+
+
+def words_needed(mask: int) -> int:
+    if mask == ALL_ATTENDEES:
+        return 1
+    return max(1, -(-mask.bit_length() // WORD_BITS))
+
+
+class ArrayIntervalStore:
+    """
+    Struct-of-arrays interval store. Lows, highs and attendee masks live in
+    contiguous NumPy arrays sorted by low, so conflict checks for many
+    candidate windows run as a handful of vectorized operations.
+
+    Drop-in replacement for AttendeeIntervalIndex inside IntervalTreeScheduler:
+    queries return IntervalTreeNode objects wrapping the stored intervals.
+    Inserts and deletes shift the arrays, so they are O(n). Only
+    find_conflicting_windows uses the vectorized conflicts(); the slot
+    search probes through search_all(), as it needs the clashing intervals
+    to jump past them.
+    """
+    def __init__(self):
+        self.lows = np.empty(0, dtype=np.int64)
+        self.highs = np.empty(0, dtype=np.int64)
+        # One row per interval, one uint64 column per 64 attendee ids
+        self.masks = np.empty((0, 1), dtype=np.uint64)
+        # Rows without attendees (ALL_ATTENDEES), which share one with everyone
+        self.wildcards = np.empty(0, dtype=bool)
+        self.nodes: List[IntervalTreeNode] = []
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @classmethod
+    def from_sorted(cls, intervals: List[Interval]) -> "ArrayIntervalStore":
+        """
+        Builds the store from intervals already sorted by low.
+        """
+        store = cls()
+        if not intervals:
+            return store
+        words = max(words_needed(x.attendee_mask) for x in intervals)
+        store.lows = np.fromiter((x.low for x in intervals), dtype=np.int64, count=len(intervals))
+        store.highs = np.fromiter((x.high for x in intervals), dtype=np.int64, count=len(intervals))
+        store.wildcards = np.fromiter((x.attendee_mask == ALL_ATTENDEES for x in intervals),
+                                      dtype=bool, count=len(intervals))
+        store.masks = np.stack([mask_to_words(x.attendee_mask, words) for x in intervals])
+        store.nodes = [IntervalTreeNode(x) for x in intervals]
+        return store
+
+    def _widen(self, words: int):
+        if words > self.masks.shape[1]:
+            extra = np.zeros((self.masks.shape[0], words - self.masks.shape[1]), dtype=np.uint64)
+            self.masks = np.hstack([self.masks, extra])
+
+    def _query_words(self, attendee_mask: int) -> np.ndarray:
+        return mask_to_words(attendee_mask, self.masks.shape[1])
+
+    def insert(self, interval):
+        self._widen(words_needed(interval.attendee_mask))
+        # Equal lows go after existing ones, like IntervalTree.insert
+        position = int(np.searchsorted(self.lows, interval.low, side="right"))
+        self.lows = np.insert(self.lows, position, interval.low)
+        self.highs = np.insert(self.highs, position, interval.high)
+        self.wildcards = np.insert(self.wildcards, position,
+                                   interval.attendee_mask == ALL_ATTENDEES)
+        self.masks = np.insert(self.masks, position,
+                               self._query_words(interval.attendee_mask), axis=0)
+        self.nodes.insert(position, IntervalTreeNode(interval))
+
+    def delete(self, interval):
+        """
+        Deletes the stored interval equal to the given one, if any.
+        """
+        first = int(np.searchsorted(self.lows, interval.low, side="left"))
+        last = int(np.searchsorted(self.lows, interval.low, side="right"))
+        for position in range(first, last):
+            if IntervalTree._intervals_equal(self.nodes[position].interval, interval):
+                break
+        else:
+            return
+        self.lows = np.delete(self.lows, position)
+        self.highs = np.delete(self.highs, position)
+        self.wildcards = np.delete(self.wildcards, position)
+        self.masks = np.delete(self.masks, position, axis=0)
+        del self.nodes[position]
+
+    def _sharing_rows(self, attendee_mask: int) -> np.ndarray:
+        """
+        Boolean row selector for intervals sharing an attendee with the mask.
+        Wildcard rows are matched through their own column, as the zero
+        words _widen() pads them with would hide them from new attendees.
+        """
+        if attendee_mask == ALL_ATTENDEES:
+            return np.ones(len(self.nodes), dtype=bool)
+        if words_needed(attendee_mask) > self.masks.shape[1]:
+            # Bits beyond the stored width belong to nobody in the store
+            attendee_mask &= (1 << (WORD_BITS * self.masks.shape[1])) - 1
+        sharing = (self.masks & self._query_words(attendee_mask)).any(axis=1)
+        if attendee_mask:
+            sharing |= self.wildcards
+        return sharing
+
+    def search_all(self, interval: Interval) -> List[IntervalTreeNode]:
+        """
+        Returns every node overlapping the given interval, ordered by low.
+        """
+        # Rows past this point start after the interval ends
+        end = int(np.searchsorted(self.lows, interval.high, side="right"))
+        hits = self.highs[:end] >= interval.low
+        hits &= self._sharing_rows(interval.attendee_mask)[:end]
+        return [self.nodes[i] for i in np.flatnonzero(hits)]
+
+    def iter_search_all(self, interval: Interval) -> Iterator[IntervalTreeNode]:
+        return iter(self.search_all(interval))
+
+    def search(self, interval: Interval):
+        hits = self.search_all(interval)
+        return hits[0] if hits else None
+
+    def inorder(self) -> List[IntervalTreeNode]:
+        return list(self.nodes)
+
+    def conflicts(self, starts, ends, attendee_mask: int) -> np.ndarray:
+        """
+        For N candidate windows [starts[i], ends[i]] and one attendee mask,
+        returns a boolean array marking the windows that clash with a stored
+        interval of those attendees. Runs in O(n + N log n).
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        sharing = self._sharing_rows(attendee_mask)
+        lows = self.lows[sharing]
+        if len(lows) == 0:
+            return np.zeros(len(starts), dtype=bool)
+        # Latest end among the intervals starting at or before each row
+        running_max_high = np.maximum.accumulate(self.highs[sharing])
+        started = np.searchsorted(lows, ends, side="right")
+        clash = np.zeros(len(starts), dtype=bool)
+        any_started = started > 0
+        clash[any_started] = running_max_high[started[any_started] - 1] >= starts[any_started]
+        return clash
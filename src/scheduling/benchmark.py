@@ -0,0 +1,207 @@
+"""
+Scheduler micro-benchmarks on synthetic calendars.
+
+    python -m src.scheduling.benchmark --sizes 10 100 1000 --output new.jsonl
+    python -m src.scheduling.benchmark --compare old.jsonl new.jsonl
+
+Each result is one JSON object per line, so runs from two versions can be
+compared with --compare, which exits non-zero on a regression.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List, Sequence, Tuple
+from src.classes import Event
+from src.scheduling.components import reschedule_by_component
+from src.scheduling.interval_tree import (Interval, IntervalTreeScheduler,
+                                          reschedule_all_meetings, total_displacement)
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+# (value, weight) pairs
+DEFAULT_DURATION_MIX = ((15, 0.1), (30, 0.4), (60, 0.35), (120, 0.15))
+DEFAULT_PRIORITY_MIX = ((1, 0.1), (2, 0.2), (3, 0.4), (4, 0.3))
+
+
+def _pick(rng: random.Random, mix: Sequence[Tuple[float, float]]):
+    values, weights = zip(*mix)
+    return rng.choices(values, weights)[0]
+
+
+def generate_calendar(n_events: int, n_attendees: int = 20, conflict_density: float = 0.2,
+                      duration_mix=DEFAULT_DURATION_MIX, priority_mix=DEFAULT_PRIORITY_MIX,
+                      attendees_per_event: Tuple[int, int] = (2, 4), seed: int = 0,
+                      start: datetime = datetime(2025, 1, 6, 9, 0, 0), n_teams: int = 1) -> List[Event]:
+    """
+    Builds a synthetic calendar of n_events. Roughly conflict_density of the
+    events are copies of an earlier event's time, shifted by under half its
+    length and sharing one of its attendees, so they clash with it. The
+    rest are laid out back to back with a gap and clash with nothing.
+    Durations (minutes) and priorities are drawn from (value, weight) mixes.
+    With n_teams > 1, events go round-robin to teams of n_attendees people
+    each, and no event has attendees from two teams.
+    """
+    rng = random.Random(seed)
+    teams = [[f"user{i}@example.com" for i in range(n_attendees)]] if n_teams == 1 else [
+        [f"team{team}-user{i}@example.com" for i in range(n_attendees)] for team in range(n_teams)]
+    team_events = [[] for _ in teams]
+    events = []
+    cursor = start
+    for i in range(n_events):
+        users, same_team = teams[i % n_teams], team_events[i % n_teams]
+        duration = timedelta(minutes=_pick(rng, duration_mix))
+        attendees = rng.sample(users, min(n_attendees, rng.randint(*attendees_per_event)))
+        if same_team and rng.random() < conflict_density:
+            clashing_with = rng.choice(same_team)
+            shift = rng.random() * (clashing_with.end_time - clashing_with.start_time) / 2
+            event_start = clashing_with.start_time + shift
+            if clashing_with.attendees[0] not in attendees:
+                attendees[0] = clashing_with.attendees[0]
+        else:
+            event_start = cursor
+            cursor += duration + timedelta(minutes=rng.choice((1, 15, 30)))
+        events.append(Event(attendees[0], event_start, event_start + duration,
+                            f"Synthetic event {i}", attendees,
+                            priority=float(_pick(rng, priority_mix))))
+        same_team.append(events[-1])
+    return events
+
+
+def _best_of(repeat: int, run) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def benchmark_size(n_events: int, ops: int = 100, repeat: int = 3, backend: str = "tree",
+                   workers: int = None, **calendar_options) -> List[dict]:
+    """
+    Times scheduler construction, insert_event, find_nearest_slot and
+    reschedule_all_meetings on one synthetic calendar size. Construction
+    and rescheduling are timed over the whole calendar; insert_event and
+    find_nearest_slot over `ops` operations against a built scheduler.
+    Times are the best of `repeat` runs. Rescheduling is run in both
+    greedy and batch mode, and also reports how far events were moved in
+    total (displacement_mins) and how many moved. Given `workers`, greedy
+    rescheduling is also timed per attendee component on that many
+    processes.
+    """
+    seed = calendar_options.pop("seed", 0)
+    events = generate_calendar(n_events, seed=seed, **calendar_options)
+    extra = generate_calendar(ops, seed=seed + 1, **calendar_options)
+    results = []
+
+    def record(name, seconds, count, **quality):
+        results.append({"benchmark": name, "n_events": n_events, "backend": backend,
+                        "ops": count, "seconds": seconds, "us_per_op": seconds / count * 1e6,
+                        **quality})
+
+    # Events are copied per run, since scheduling moves them
+    fresh = lambda source: [Event(x.creator, x.start_time, x.end_time, x.summary,
+                                  list(x.attendees), x.priority) for x in source]
+
+    record("construction", _best_of(repeat, lambda: IntervalTreeScheduler(fresh(events), backend)), 1)
+    for mode, name in (("greedy", "reschedule_all_meetings"), ("batch", "reschedule_all_meetings_batch")):
+        seconds = _best_of(repeat, lambda: reschedule_all_meetings(fresh(events), backend, mode=mode))
+        intervals = reschedule_all_meetings(fresh(events), backend, mode=mode)
+        record(name, seconds, 1, displacement_mins=total_displacement(intervals) / 60,
+               moved=sum(x.low != x.start_ts for x in intervals))
+
+    if workers:
+        record(f"reschedule_by_component_{workers}w", _best_of(repeat, lambda: reschedule_by_component(
+            fresh(events), backend, max_workers=workers, min_parallel_events=0)), 1)
+
+    def insert_events():
+        scheduler = IntervalTreeScheduler(fresh(events), backend)
+        started = time.perf_counter()
+        for event in fresh(extra):
+            scheduler.insert_event(event)
+        return time.perf_counter() - started
+    record("insert_event", min(insert_events() for _ in range(repeat)), ops)
+
+    scheduler = IntervalTreeScheduler(fresh(events), backend)
+    probes = [Interval.from_event(x, scheduler.registry) for x in extra]
+    record("find_nearest_slot",
+           _best_of(repeat, lambda: [scheduler.find_nearest_slot(x) for x in probes]), ops)
+    return results
+
+
+def run_benchmarks(sizes: Sequence[int] = DEFAULT_SIZES, label: str = "", **options) -> List[dict]:
+    results = []
+    for n_events in sizes:
+        for result in benchmark_size(n_events, **options):
+            result["label"] = label
+            results.append(result)
+    return results
+
+
+def compare_results(baseline: List[dict], current: List[dict], threshold: float = 1.2) -> List[dict]:
+    """
+    Pairs results on (benchmark, n_events, backend) and returns those whose
+    time per op grew by more than `threshold` times.
+    """
+    key = lambda x: (x["benchmark"], x["n_events"], x["backend"])
+    before = {key(x): x for x in baseline}
+    regressions = []
+    for result in current:
+        old = before.get(key(result))
+        if old and result["us_per_op"] > old["us_per_op"] * threshold:
+            regressions.append({"benchmark": result["benchmark"], "n_events": result["n_events"],
+                                "backend": result["backend"], "before_us": old["us_per_op"],
+                                "after_us": result["us_per_op"],
+                                "ratio": result["us_per_op"] / old["us_per_op"]})
+    return regressions
+
+
+def _read_results(path: str) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--ops", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", choices=("tree", "array"), default="tree")
+    parser.add_argument("--attendees", type=int, default=20)
+    parser.add_argument("--conflict-density", type=float, default=0.2)
+    parser.add_argument("--teams", type=int, default=1,
+                        help="Split attendees into this many teams that never meet each other")
+    parser.add_argument("--workers", type=int,
+                        help="Also time rescheduling per attendee component on this many processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default="", help="Tag stored with each result, e.g. a commit id")
+    parser.add_argument("--output", help="Write JSON lines here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Report regressions between two result files and exit")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        regressions = compare_results(*map(_read_results, args.compare), threshold=args.threshold)
+        for regression in regressions:
+            print(json.dumps(regression))
+        return 1 if regressions else 0
+
+    results = run_benchmarks(args.sizes, label=args.label, ops=args.ops, repeat=args.repeat,
+                             backend=args.backend, workers=args.workers,
+                             n_attendees=args.attendees, n_teams=args.teams,
+                             conflict_density=args.conflict_density, seed=args.seed)
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for result in results:
+            out.write(json.dumps(result) + "\n")
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
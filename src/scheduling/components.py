@@ -0,0 +1,127 @@
+"""
+Splits a calendar into groups of events that can never affect each other's
+schedule and schedules the groups independently, in parallel processes.
+
+Two events only interact if they share an attendee, so the groups are the
+connected components of the "shares an attendee" graph. Time overlap is not
+enough to separate them: a rescheduled event can move onto any event of its
+attendees, not just the ones it originally overlapped.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+from src.classes import Event
+from src.scheduling.interval_tree import (AttendeeRegistry, Interval, IntervalTreeScheduler,
+                                          find_event_conflicts, resolve_attendees)
+
+# Below this many events to schedule, a process pool costs more than it saves
+PARALLEL_MIN_EVENTS = int(os.environ.get("SCHEDULER_PARALLEL_MIN_EVENTS", "2000"))
+
+
+class DisjointSet:
+    """Union-find over 0..n-1 with union by size and path halving."""
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+
+def attendee_components(events: List[Event]) -> List[List[int]]:
+    """
+    Groups event positions into components linked by shared attendees,
+    each in list order. "SELF" stands for each event's own creator, so
+    solo events only join their creator's component. Events without
+    attendees clash with everyone, so they join every event into one
+    component.
+    """
+    components = DisjointSet(len(events))
+    first_with: Dict[str, int] = {}
+    without_attendees = None
+    for i, event in enumerate(events):
+        if event.attendees is None:
+            if without_attendees is None:
+                without_attendees = i
+            components.union(without_attendees, i)
+            continue
+        for attendee in resolve_attendees(event.attendees, event.creator):
+            j = first_with.setdefault(attendee, i)
+            components.union(i, j)
+    if without_attendees is not None:
+        for i in range(len(events)):
+            components.union(without_attendees, i)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(events)):
+        groups.setdefault(components.find(i), []).append(i)
+    return list(groups.values())
+
+
+def schedule_component(events: List[Event], backend: str = "tree", working_hours=None,
+                       mode: str = "greedy") -> List[Tuple[int, int]]:
+    """
+    Schedules one component and returns each event's (low, high), in list
+    order. Runs in worker processes, so it returns plain numbers rather
+    than the scheduler's trees.
+    """
+    scheduler = IntervalTreeScheduler(events, backend, working_hours, mode)
+    placed = {id(x.interval.event): (x.interval.low, x.interval.high)
+              for x in scheduler.interval_tree.iter_inorder()}
+    return [placed[id(event)] for event in events]
+
+
+def _schedule_component_args(args):
+    return schedule_component(*args)
+
+
+def reschedule_by_component(events: List[Event], backend: str = "tree", working_hours=None,
+                            mode: str = "greedy", max_workers: int = None,
+                            min_parallel_events: int = PARALLEL_MIN_EVENTS) -> List[Interval]:
+    """
+    Same result as reschedule_all_meetings, computed per attendee
+    component, for bulk rescheduling of whole calendars (the benchmark);
+    the service's ResidentScheduler schedules incrementally instead.
+    Components without a single clash keep their times without
+    building a scheduler. The rest are spread over a process pool of
+    max_workers processes when there are at least min_parallel_events of
+    them in more than one component, and scheduled in this process
+    otherwise. Returns the intervals in time order.
+    """
+    clashing = {i for pair in find_event_conflicts(events) for i in pair}
+    spans: List[Tuple[int, int]] = [(event.start_ts, event.end_ts) for event in events]
+    busy = [component for component in attendee_components(events)
+            if any(i in clashing for i in component)]
+
+    jobs = [([events[i] for i in component], backend, working_hours, mode) for component in busy]
+    if len(busy) > 1 and sum(map(len, busy)) >= min_parallel_events and max_workers != 1:
+        with ProcessPoolExecutor(max_workers) as pool:
+            results = list(pool.map(_schedule_component_args, jobs))
+    else:
+        results = [schedule_component(*job) for job in jobs]
+
+    for component, placements in zip(busy, results):
+        for i, span in zip(component, placements):
+            spans[i] = span
+
+    registry = AttendeeRegistry()
+    intervals = []
+    for event, (low, high) in zip(events, spans):
+        interval = Interval.from_event(event, registry)
+        interval.update_time(low, high)
+        intervals.append(interval)
+    intervals.sort(key=lambda x: x.low)
+    return intervals
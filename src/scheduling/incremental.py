@@ -0,0 +1,179 @@
+import threading
+from typing import Dict, List, NamedTuple
+from src.classes import Event
+from src.scheduling.interval_tree import Interval, IntervalTreeScheduler
+
+
+def event_signature(event: Event) -> tuple:
+    """
+    Everything about an event that affects where it can be scheduled.
+    """
+    attendees = None if event.attendees is None else tuple(event.attendees)
+    return (event.creator, event.summary, event.start_ts, event.end_ts, attendees)
+
+
+def event_keys(events: List[Event]) -> list:
+    """
+    Identity of each event across fetches: its Google Calendar id when
+    known, otherwise its signature numbered by how many identical id-less
+    events come before it in the list, so exact duplicates stay apart.
+    """
+    occurrences: Dict[tuple, int] = {}
+    keys = []
+    for event in events:
+        if event.event_id:
+            keys.append(event.event_id)
+            continue
+        signature = event_signature(event)
+        occurrence = occurrences[signature] = occurrences.get(signature, -1) + 1
+        keys.append(signature + (occurrence,))
+    return keys
+
+
+class CalendarChanges(NamedTuple):
+    added: List[Event]
+    changed: List[Event]
+    removed: List[Event]
+    # id() of every event above -> its key
+    keys: Dict[int, object]
+
+
+class ResidentScheduler:
+    """
+    Keeps one IntervalTreeScheduler alive across requests. Each fetched
+    calendar is diffed against the resident one and applied as inserts and
+    deletes, and a request's new event is placed inside a journaled
+    transaction that is rolled back once its schedule has been read out.
+    Per-request work scales with the size of the change, not the calendar.
+    """
+    def __init__(self, backend: str = "tree", working_hours=None):
+        self.scheduler = IntervalTreeScheduler([], backend, working_hours)
+        self.events: Dict[object, Event] = {}
+        self.signatures: Dict[object, tuple] = {}
+        self.intervals: Dict[object, Interval] = {}
+        # Intervals currently away from their original slot, by id
+        self.displaced: Dict[int, Interval] = {}
+        self.lock = threading.Lock()
+
+    def diff(self, events: List[Event]) -> CalendarChanges:
+        """
+        Compares a freshly fetched calendar with the resident one. Unchanged
+        events take over the priority already known for them, so only added
+        and changed events need prioritizing before apply().
+        """
+        added, changed = [], []
+        keys = {}
+        seen = set()
+        with self.lock:
+            for event, key in zip(events, event_keys(events)):
+                keys[id(event)] = key
+                seen.add(key)
+                known = self.signatures.get(key)
+                if known is None:
+                    added.append(event)
+                elif known != event_signature(event):
+                    changed.append(event)
+                else:
+                    event.priority = self.events[key].priority
+            removed = []
+            for key, event in self.events.items():
+                if key not in seen:
+                    keys[id(event)] = key
+                    removed.append(event)
+        return CalendarChanges(added, changed, removed, keys)
+
+    def apply(self, changes: CalendarChanges):
+        """
+        Applies a diff from diff(). Displaced events whose original slot
+        overlaps a freed one are moved back as close to it as they can get.
+        """
+        with self.lock:
+            if not self.intervals and not changes.changed and not changes.removed:
+                self._load(changes.added, [changes.keys[id(event)] for event in changes.added])
+                return
+
+            self.scheduler.begin()
+            # Another request may have applied some of these changes since
+            # diff(), so each one is checked against the current state
+            to_place = [event for event in changes.added + changes.changed
+                        if self.signatures.get(changes.keys[id(event)]) != event_signature(event)]
+            freed = []
+            for event in changes.removed + to_place:
+                key = changes.keys[id(event)]
+                interval = self.intervals.pop(key, None)
+                if interval is None:
+                    continue
+                freed.append(interval)
+                self.displaced.pop(id(interval), None)
+                self.scheduler.remove_interval(interval)
+                del self.events[key]
+                del self.signatures[key]
+            for event in to_place:
+                self._remember(changes.keys[id(event)], event, self.scheduler.insert_event(event))
+            self._reseat_displaced(freed)
+            # Removed intervals are in the journal too; they must not be
+            # tracked, or a later reseat would put them back in the tree
+            removed = {id(interval) for interval in freed}
+            self._track_displaced([interval for interval in self.scheduler.commit()
+                                   if id(interval) not in removed])
+
+    def schedule_new_event(self, new_event: Event) -> List[Event]:
+        """
+        Returns the resident schedule with new_event placed in it, as event
+        copies carrying final times. The resident state is left unchanged.
+        """
+        with self.lock:
+            self.scheduler.begin()
+            try:
+                self.scheduler.insert_event(new_event)
+                return [scheduled_copy(node.interval)
+                        for node in self.scheduler.interval_tree.iter_inorder()]
+            finally:
+                self.scheduler.rollback()
+
+    def _load(self, events: List[Event], keys: list):
+        # First fetch: bulk-load instead of placing events one at a time
+        intervals = self.scheduler.create_interval_tree(events)
+        for key, event, interval in zip(keys, events, intervals):
+            self._remember(key, event, interval)
+        self._track_displaced(intervals)
+
+    def _remember(self, key, event: Event, interval: Interval):
+        self.events[key] = event
+        self.signatures[key] = event_signature(event)
+        self.intervals[key] = interval
+
+    def _track_displaced(self, intervals: List[Interval]):
+        for interval in intervals:
+            if (interval.low, interval.high) != original_span(interval):
+                self.displaced[id(interval)] = interval
+            else:
+                self.displaced.pop(id(interval), None)
+
+    def _reseat_displaced(self, freed: List[Interval]):
+        if not freed or not self.displaced:
+            return
+        candidates = []
+        for interval in self.displaced.values():
+            low, high = original_span(interval)
+            probe = Interval(low, high, interval.attendees, interval.attendee_mask)
+            if any(probe.overlaps(x) for x in freed):
+                candidates.append(interval)
+        # Most important events get first pick of the freed time
+        for interval in sorted(candidates, key=lambda x: x.priority):
+            self.scheduler.reseat_interval(interval, *original_span(interval))
+
+
+def original_span(interval: Interval):
+    return interval.start_ts, interval.end_ts
+
+
+def scheduled_copy(interval: Interval) -> Event:
+    """
+    Detached copy of a placed interval's event with its final times set.
+    """
+    event = Event(interval.creator, interval.start_time, interval.end_time,
+                  interval.summary, list(interval.attendees), interval.priority,
+                  event_id=interval.event_id)
+    event.final_start_ts, event.final_end_ts = interval.low, interval.high
+    return event
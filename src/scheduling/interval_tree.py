@@ -1,13 +1,79 @@
 from datetime import datetime, timezone
-from src.classes import Event
-from typing import List
+from src.classes import Event, from_epoch
+from src.metrics import NO_SLOT_FOUND, SLOTS_PROBED
+from src.scheduling.working_hours import DEFAULT_KEY, WorkingHours, intersect_stretches
+from typing import Dict, Iterator, List, Tuple
+import bisect
+import heapq
+
+
+# Mask of an interval whose attendees are unknown; it shares attendees with everyone
+ALL_ATTENDEES = -1
+
+
+class AttendeeRegistry:
+    """
+    Interns attendee emails into small integer ids so an attendee list can
+    be stored as an int bitmask, with bit i set for the attendee with id i.
+    """
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def mask(self, attendees) -> int:
+        if attendees is None:
+            return ALL_ATTENDEES
+        mask = 0
+        for attendee in attendees:
+            attendee_id = self.ids.get(attendee)
+            if attendee_id is None:
+                attendee_id = self.ids[attendee] = len(self.ids)
+            mask |= 1 << attendee_id
+        return mask
+
+
+def iter_attendee_ids(mask: int) -> Iterator[int]:
+    """
+    Yields the attendee ids set in a bitmask, lowest first.
+    """
+    if mask < 0:
+        raise ValueError("Cannot list the attendees of an interval without attendees")
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+# Used by intervals built without an explicit registry
+default_registry = AttendeeRegistry()
+
+
+def resolve_attendees(attendees, creator: str):
+    """
+    The attendee list with the "SELF" placeholder replaced by the event's
+    creator, so one user's solo events do not clash with another's.
+    """
+    if attendees is None:
+        return None
+    return [creator if attendee == "SELF" else attendee for attendee in attendees]
 
 
 class Interval:
-    def __init__(self, low, high, attendees=None):
+    """
+    The scheduled position [low, high] (unix seconds) of an event. Event
+    details are read through from the event itself rather than copied, so
+    an interval is only its position, its attendee mask and a reference.
+    Intervals built without an event (probes, tests) have no details.
+    """
+    __slots__ = ("low", "high", "attendees", "attendee_mask", "event")
+
+    def __init__(self, low, high, attendees=None, attendee_mask=None, registry=None, event=None):
         self.low = low
         self.high = high
         self.attendees=attendees
+        if attendee_mask is None:
+            attendee_mask = (registry or default_registry).mask(attendees)
+        self.attendee_mask = attendee_mask
+        self.event = event
     
     def update_time(self, low, high):
         self.low = low
@@ -15,45 +81,52 @@ class Interval:
 
         
     @classmethod
-    def from_event(cls, event: Event):
-        interval = cls(
-            low = get_unix_time(event.start_time),
-            high = get_unix_time(event.end_time)
-        )
-        
-        # Copy over remaining fields manually
-        interval.creator = event.creator
-        interval.start_time = event.start_time
-        interval.end_time = event.end_time
-        interval.summary = event.summary
-        interval.window_start_time = event.window_start_time
-        interval.window_end_time = event.window_end_time
-        interval.final_start_time = event.final_start_time
-        interval.final_end_time = event.final_end_time
-        interval.attendees = event.attendees
-        interval.priority = event.priority
-        return interval
+    def from_event(cls, event: Event, registry=None):
+        mask = (registry or default_registry).mask(resolve_attendees(event.attendees, event.creator))
+        return cls(event.start_ts, event.end_ts, event.attendees, mask, event=event)
+
+    def _event_field(self, name):
+        return None if self.event is None else getattr(self.event, name)
+
+    event_id = property(lambda self: self._event_field("event_id"))
+    creator = property(lambda self: self._event_field("creator"))
+    summary = property(lambda self: self._event_field("summary"))
+    priority = property(lambda self: self._event_field("priority"))
+    tz = property(lambda self: self._event_field("tz"))
+    # Where the event was before any rescheduling
+    start_ts = property(lambda self: self._event_field("start_ts"))
+    end_ts = property(lambda self: self._event_field("end_ts"))
+    start_time = property(lambda self: self._event_field("start_time"))
+    end_time = property(lambda self: self._event_field("end_time"))
+    window_start_ts = property(lambda self: self._event_field("window_start_ts"))
+    window_end_ts = property(lambda self: self._event_field("window_end_ts"))
+
+    # Datetimes of the scheduled position, in the event's timezone
+    @property
+    def final_start_time(self) -> datetime:
+        return from_epoch(self.low, self.tz)
+
+    @property
+    def final_end_time(self) -> datetime:
+        return from_epoch(self.high, self.tz)
     
     def to_event(self) -> Event:
-        start_time = datetime.fromtimestamp(self.low)
-        end_time = datetime.fromtimestamp(self.high)
-        creator = self.creator
-        summary = self.summary
-
+        """
+        Copy of the event moved to this interval's position.
+        """
         event = Event(
-            creator=creator,
-            start_time=start_time,
-            end_time=end_time,
-            summary=summary,
+            creator=self.creator,
+            start_time=self.final_start_time,
+            end_time=self.final_end_time,
+            summary=self.summary,
             attendees=self.attendees
         )
         event.priority = self.priority
         return event
 
     def overlaps(self, other):
-        time_overlap = self.low <= other.high and other.low <= self.high
-        attendee_overlap = bool(set(self.attendees) & set(other.attendees))
-        return time_overlap and attendee_overlap
+        return (self.low <= other.high and other.low <= self.high
+                and (self.attendee_mask & other.attendee_mask) != 0)
 
 
 RED = "RED"
@@ -149,6 +222,9 @@ class IntervalTree:
             y.right = node
 
         node.color = RED
+        # Refresh max on the whole insertion path before rebalancing; the
+        # recolouring case of _fix_insert skips straight to the grandparent.
+        self._update_ancestors_max(node)
         self._fix_insert(node)
     
     def _fix_insert(self, z):
@@ -227,45 +303,98 @@ class IntervalTree:
         
         return x if x != self.NIL else None
     
-    def search_all(self,
-                   interval: Interval,
-                   node=None,
-                   result=None) -> List[IntervalTreeNode]:
-        if result is None:
-            result = []
-        if node is None:
-            node = self.root
-        if node == self.NIL:
-            return result
+    def search_all(self, interval: Interval) -> List[IntervalTreeNode]:
+        """
+        Returns every node overlapping the given interval, ordered by low.
+        """
+        return list(self.iter_search_all(interval))
 
-        # Traverse left subtree only if potential overlaps exist
-        if node.left != self.NIL and node.left.max >= interval.low:
-            self.search_all(interval, node.left, result)
+    def iter_search_all(self, interval: Interval) -> Iterator[IntervalTreeNode]:
+        """
+        Lazily yields every node overlapping the given interval, ordered by
+        low. Uses an explicit stack, so callers can stop after the first hit.
+        """
+        stack = []
+        node = self.root
+        while stack or node != self.NIL:
+            # Descend left only while the left subtree can still reach interval.low
+            while node != self.NIL:
+                stack.append(node)
+                if node.left != self.NIL and node.left.max >= interval.low:
+                    node = node.left
+                else:
+                    node = self.NIL
+            node = stack.pop()
 
-        # Check current node for overlap
-        if node.interval.overlaps(interval):
-            result.append(node)
+            if node.interval.overlaps(interval):
+                yield node
 
-        # Traverse right subtree if intervals could still overlap
-        if node.right != self.NIL and node.interval.low <= interval.high:
-            self.search_all(interval, node.right, result)
+            # Go right only if intervals there can still overlap
+            if (node.right != self.NIL and node.interval.low <= interval.high
+                    and node.right.max >= interval.low):
+                node = node.right
+            else:
+                node = self.NIL
 
-        return result
+    def inorder(self, x=None) -> List[IntervalTreeNode]:
+        """
+        Returns in-order traversal of tree (for debugging/inspection).
+        """
+        return list(self.iter_inorder(x))
 
+    def iter_inorder(self, x=None) -> Iterator[IntervalTreeNode]:
+        """
+        Lazily yields the nodes under x (the root by default) in order of low.
+        """
+        stack = []
+        node = self.root if x is None else x
+        while stack or node != self.NIL:
+            while node != self.NIL:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node
+            node = node.right
 
-    def inorder(self, x=None, result=None) -> List[IntervalTreeNode]:
+    @classmethod
+    def from_sorted(cls, intervals: List[Interval]) -> "IntervalTree":
         """
-        Returns in-order traversal of tree (for debugging/inspection).
+        Builds a balanced tree from intervals already sorted by low in O(n),
+        with no rebalancing. Every level but the deepest is full, so colouring
+        the deepest level red and everything else black is a valid red-black
+        tree. max is filled in bottom-up afterwards.
         """
-        if result is None:
-            result = []
-        if x is None:
-            x = self.root
-        if x != self.NIL:
-            self.inorder(x.left, result)
-            result.append(x)
-            self.inorder(x.right, result)
-        return result
+        tree = cls()
+        if not intervals:
+            return tree
+        deepest = len(intervals).bit_length() - 1
+
+        created = []
+        # (lo, hi, parent, is_left_child, depth) ranges still to be built
+        stack = [(0, len(intervals), None, False, 0)]
+        while stack:
+            lo, hi, parent, is_left, depth = stack.pop()
+            mid = (lo + hi) // 2
+            node = IntervalTreeNode(intervals[mid],
+                                    color=RED if 0 < depth == deepest else BLACK)
+            node.left = node.right = tree.NIL
+            node.parent = parent
+            if parent is None:
+                tree.root = node
+            elif is_left:
+                parent.left = node
+            else:
+                parent.right = node
+            created.append(node)
+            if lo < mid:
+                stack.append((lo, mid, node, True, depth + 1))
+            if mid + 1 < hi:
+                stack.append((mid + 1, hi, node, False, depth + 1))
+
+        # Children are always created after their parent
+        for node in reversed(created):
+            tree._update_max(node)
+        return tree
     
     def delete(self, interval):
         """
@@ -305,22 +434,31 @@ class IntervalTree:
         if y_original_color == BLACK:
             self._fix_delete(x)
 
-    def _intervals_equal(self, a, b):
+    @staticmethod
+    def _intervals_equal(a, b):
         return (
             a.low == b.low and
             a.high == b.high and
-            set(a.attendees) == set(b.attendees) and
-            a.summary == b.summary and
-            a.creator == b.creator
+            a.attendee_mask == b.attendee_mask and
+            a.event is b.event
         )
     def _find_node(self, node, interval):
-        while node != self.NIL:
+        # Equal lows can end up on either side of each other after rotations
+        # or a bulk load, so both subtrees are searched on a tie
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node == self.NIL:
+                continue
             if self._intervals_equal(interval, node.interval):
                 return node
             elif interval.low < node.interval.low:
-                node = node.left
+                stack.append(node.left)
+            elif interval.low > node.interval.low:
+                stack.append(node.right)
             else:
-                node = node.right
+                stack.append(node.left)
+                stack.append(node.right)
         return self.NIL
 
     def _minimum(self, node):
@@ -384,14 +522,172 @@ class IntervalTree:
         x.color = BLACK
     
 
+class AttendeeIntervalIndex:
+    """
+    One IntervalTree per attendee id. An interval is stored in the tree of
+    every attendee in its mask, so a conflict query only descends through
+    the trees of the people in the query instead of everyone's meetings.
+    Intervals without attendees (ALL_ATTENDEES) clash with everyone: they
+    live in a wildcard tree that every query also searches, and a query
+    without attendees searches every tree.
+    """
+    def __init__(self):
+        self.trees: Dict[int, IntervalTree] = {}
+        self.wildcard = IntervalTree()
+
+    def _query_trees(self, mask: int) -> Iterator[IntervalTree]:
+        if mask < 0:
+            yield from self.trees.values()
+        else:
+            for attendee_id in iter_attendee_ids(mask):
+                tree = self.trees.get(attendee_id)
+                if tree is not None:
+                    yield tree
+        yield self.wildcard
+
+    def insert(self, interval):
+        if interval.attendee_mask < 0:
+            self.wildcard.insert(interval)
+            return
+        for attendee_id in iter_attendee_ids(interval.attendee_mask):
+            tree = self.trees.get(attendee_id)
+            if tree is None:
+                tree = self.trees[attendee_id] = IntervalTree()
+            tree.insert(interval)
+
+    def delete(self, interval):
+        if interval.attendee_mask < 0:
+            self.wildcard.delete(interval)
+            return
+        for attendee_id in iter_attendee_ids(interval.attendee_mask):
+            tree = self.trees.get(attendee_id)
+            if tree is not None:
+                tree.delete(interval)
+
+    def search(self, interval):
+        """
+        Returns a node overlapping the given interval from any of its
+        attendees' trees, otherwise None.
+        """
+        for tree in self._query_trees(interval.attendee_mask):
+            node = tree.search(interval)
+            if node is not None:
+                return node
+        return None
+
+    def search_all(self, interval: Interval) -> List[IntervalTreeNode]:
+        """
+        Returns one node per distinct overlapping interval. An interval
+        shared by several of the queried attendees is reported once.
+        """
+        return list(self.iter_search_all(interval))
+
+    def iter_search_all(self, interval: Interval) -> Iterator[IntervalTreeNode]:
+        """
+        Lazily yields one node per distinct overlapping interval, attendee
+        by attendee.
+        """
+        seen = set()
+        for tree in self._query_trees(interval.attendee_mask):
+            for node in tree.iter_search_all(interval):
+                if id(node.interval) not in seen:
+                    seen.add(id(node.interval))
+                    yield node
+
+    @classmethod
+    def from_sorted(cls, intervals: List[Interval]) -> "AttendeeIntervalIndex":
+        """
+        Bulk-loads every attendee's tree from intervals already sorted by low.
+        """
+        index = cls()
+        per_attendee: Dict[int, List[Interval]] = {}
+        wildcard = []
+        for interval in intervals:
+            if interval.attendee_mask < 0:
+                wildcard.append(interval)
+                continue
+            for attendee_id in iter_attendee_ids(interval.attendee_mask):
+                per_attendee.setdefault(attendee_id, []).append(interval)
+        for attendee_id, attendee_intervals in per_attendee.items():
+            index.trees[attendee_id] = IntervalTree.from_sorted(attendee_intervals)
+        index.wildcard = IntervalTree.from_sorted(wildcard)
+        return index
+
+
+def total_displacement(intervals: List[Interval]) -> int:
+    """Seconds the intervals were moved from their events' original starts, summed."""
+    return sum(abs(x.low - x.start_ts) for x in intervals)
+
+
 def get_unix_time(time_val: datetime) -> int:
     return int(time_val.timestamp())
+
+
+def find_conflicting_pairs(intervals: List[Interval]) -> List[Tuple[int, int]]:
+    """
+    Sweep-line pass over intervals sorted by low. Returns every pair (i, j),
+    i < j, of positions in the list whose intervals overlap in time and share
+    an attendee. Runs in O(n log n + sum of active intervals per step).
+    """
+    order = sorted(range(len(intervals)), key=lambda i: intervals[i].low)
+    active = []  # heap of (high, position) still open at the sweep point
+    pairs = []
+    for i in order:
+        interval = intervals[i]
+        # Touching intervals overlap, so only drop the ones ending strictly before
+        while active and active[0][0] < interval.low:
+            heapq.heappop(active)
+        for _, j in active:
+            if intervals[j].attendee_mask & interval.attendee_mask:
+                pairs.append((min(i, j), max(i, j)))
+        heapq.heappush(active, (interval.high, i))
+    return pairs
+
+
+def find_event_conflicts(events: List[Event]) -> List[Tuple[int, int]]:
+    """
+    Returns every pair (i, j) of positions in the event list whose events
+    overlap in time and share an attendee, before any rescheduling.
+    """
+    registry = AttendeeRegistry()
+    return find_conflicting_pairs([Interval.from_event(event, registry) for event in events])
     
 
+def get_conflict_index_class(backend: str):
+    """
+    Maps a scheduler backend name to the class answering its conflict
+    queries: "tree" for per-attendee interval trees, "array" for the NumPy
+    struct-of-arrays store.
+    """
+    if backend == "tree":
+        return AttendeeIntervalIndex
+    if backend == "array":
+        from src.scheduling.array_store import ArrayIntervalStore
+        return ArrayIntervalStore
+    raise ValueError(f"Unknown scheduler backend: '{backend}'")
+
+
+# How create_interval_tree resolves the clashes in a calendar
+SCHEDULING_MODES = ("greedy", "batch")
+
+
 class IntervalTreeScheduler:
-    def __init__(self, event_list: List[Event]):
+    def __init__(self, event_list: List[Event], backend: str = "tree",
+                 working_hours: Dict[str, WorkingHours] = None, mode: str = "greedy"):
+        if mode not in SCHEDULING_MODES:
+            raise ValueError(f"Unknown scheduling mode: '{mode}'")
+        self.mode = mode
         # self.interval_list = [Interval.from_event(event) for event in event_list]
+        self.registry = AttendeeRegistry()
         self.interval_tree = IntervalTree()
+        # Conflict queries go through the backend's index; interval_tree
+        # keeps the single time-ordered view of the whole schedule.
+        self.conflict_index_class = get_conflict_index_class(backend)
+        self.conflict_index = self.conflict_index_class()
+        # While not None, records every change so it can be rolled back
+        self.journal = None
+        # Attendee email (or DEFAULT_KEY) -> hours slots must stay inside
+        self.working_hours = working_hours or {}
         self.create_interval_tree(event_list)
         # if pre existing schedule has conflicts
 
@@ -399,64 +695,240 @@ class IntervalTreeScheduler:
         answer = "In order traversal of interval tree:\n"
         list_nodes = self.interval_tree.inorder()
         for node in list_nodes:
-            answer+= f"[{datetime.fromtimestamp(node.interval.low)}, {datetime.fromtimestamp(node.interval.high)}], {node.interval.summary}, priority = {node.interval.priority} \n"
+            answer+= f"[{node.interval.final_start_time}, {node.interval.final_end_time}], {node.interval.summary}, priority = {node.interval.priority} \n"
             answer+= f"attendees: {node.interval.attendees} \n"
             answer += '\n'
         return answer
 
-    def create_interval_tree(self, event_list: List[Event]) -> IntervalTree:
-        #interval_tree = IntervalTree()
-        for event in event_list:
-            interval = Interval.from_event(event)
-            #interval_tree.insert(interval)
-            self.insert_event(event)
-        #return interval_tree
-    
-    def insert_event(self, event: Event):
-        event_interval = Interval.from_event(event)
-        clashing_interval_tree_nodes = self.interval_tree.search_all(event_interval)
+    def create_interval_tree(self, event_list: List[Event]) -> List[Interval]:
+        """
+        A sweep-line pass finds the events that clash with nothing; those
+        are bulk-loaded in O(n). In "greedy" mode the clashing ones are then
+        placed one at a time, in list order, through the usual rescheduling
+        path, which can move events placed before them. In "batch" mode they
+        are placed most important first (priority 1 first, then by start),
+        each at the free slot nearest its original time, and nothing placed
+        is moved again, so the result does not depend on list order.
+        Returns the placed intervals in event list order.
+        """
+        intervals = [Interval.from_event(event, self.registry) for event in event_list]
+        self.conflicting_pairs = find_conflicting_pairs(intervals)
+        clashing = set()
+        for i, j in self.conflicting_pairs:
+            clashing.add(i)
+            clashing.add(j)
+
+        free_intervals = sorted((x for i, x in enumerate(intervals) if i not in clashing),
+                                key=lambda x: x.low)
+        self.interval_tree = IntervalTree.from_sorted(free_intervals)
+        self.conflict_index = self.conflict_index_class.from_sorted(free_intervals)
+        if self.mode == "batch":
+            order = lambda i: (intervals[i].priority, intervals[i].low, intervals[i].high,
+                               intervals[i].summary or "", i)
+            for i in sorted(clashing, key=order):
+                self._place_at_nearest_free_slot(intervals[i])
+        else:
+            for i in sorted(clashing):
+                self._place_interval(intervals[i])
+        return intervals
+
+    def insert_event(self, event: Event) -> Interval:
+        return self._place_interval(Interval.from_event(event, self.registry))
+
+    def _place_interval(self, event_interval):
+        clashing_interval_tree_nodes = self.conflict_index.search_all(event_interval)
         clashing_intervals = [x.interval for x in clashing_interval_tree_nodes]
         clashing_intervals.append(event_interval)
         sorted_clashing_intervals = sorted(clashing_intervals, 
                                            key = lambda x: x.priority,
                                            reverse=True)
-        self.interval_tree.insert(event_interval)
+        self._insert_interval(event_interval)
+        if self.journal is not None:
+            self.journal.append((event_interval, None, None))
         for interval in sorted_clashing_intervals:
-            self.interval_tree.delete(interval)
-            new_low, new_high = self.find_nearest_slot(interval)
+            self._delete_interval(interval)
+            slot = self.find_nearest_slot(interval)
+            if slot is None:
+                # Nothing fits its window and working hours; it stays put
+                NO_SLOT_FOUND.inc()
+                self._insert_interval(interval)
+                continue
+            new_low, new_high = slot
+            if self.journal is not None:
+                self.journal.append((interval, interval.low, interval.high))
             interval.update_time(new_low,new_high)
-            self.interval_tree.insert(interval)
+            self._insert_interval(interval)
+        return event_interval
+
+    def _place_at_nearest_free_slot(self, interval):
+        slot = self.find_nearest_slot(interval)
+        if slot is None:
+            NO_SLOT_FOUND.inc()
+        else:
+            interval.update_time(*slot)
+        self._insert_interval(interval)
+        if self.journal is not None:
+            self.journal.append((interval, None, None))
+
+    def reseat_interval(self, interval, low, high):
+        """
+        Moves an already placed interval to the free slot nearest [low, high],
+        staying where it is if there is none.
+        """
+        previous_low, previous_high = interval.low, interval.high
+        self._delete_interval(interval)
+        if self.journal is not None:
+            self.journal.append((interval, previous_low, previous_high))
+        interval.update_time(low, high)
+        new_low, new_high = self.find_nearest_slot(interval) or (previous_low, previous_high)
+        interval.update_time(new_low, new_high)
+        self._insert_interval(interval)
+
+    def remove_interval(self, interval):
+        self._delete_interval(interval)
+        if self.journal is not None:
+            self.journal.append((interval, interval.low, interval.high))
+
+    def begin(self):
+        """
+        Starts journaling changes. Placements made until commit() or
+        rollback() can be undone together.
+        """
+        self.journal = []
+
+    def commit(self) -> List[Interval]:
+        """
+        Keeps the journaled changes and returns the intervals they touched.
+        """
+        journal, self.journal = self.journal, None
+        return list({id(entry[0]): entry[0] for entry in journal}.values())
+
+    def rollback(self):
+        """
+        Undoes every journaled change, newest first.
+        """
+        journal, self.journal = self.journal, None
+        for interval, low, high in reversed(journal):
+            if low is None:
+                # Interval was added during the transaction
+                self._delete_interval(interval)
+                continue
+            self._delete_interval(interval)
+            interval.update_time(low, high)
+            self._insert_interval(interval)
+
+    def find_conflicting_windows(self, starts, ends, attendees) -> List[bool]:
+        """
+        For candidate windows [starts[i], ends[i]], reports which ones clash
+        with the current schedule of the given attendees. The array backend
+        answers all windows in one vectorized pass.
+        """
+        attendee_mask = self.registry.mask(attendees)
+        if hasattr(self.conflict_index, "conflicts"):
+            return self.conflict_index.conflicts(starts, ends, attendee_mask).tolist()
+        return [self.conflict_index.search(Interval(start, end, attendees, attendee_mask)) is not None
+                for start, end in zip(starts, ends)]
+
+    def _insert_interval(self, interval):
+        self.interval_tree.insert(interval)
+        self.conflict_index.insert(interval)
+
+    def _delete_interval(self, interval):
+        self.interval_tree.delete(interval)
+        self.conflict_index.delete(interval)
     
+    def allowed_stretches(self, interval, low: int, high: int) -> List[Tuple[int, int]]:
+        """
+        Sorted stretches within [low, high] that the interval may occupy:
+        inside its event's window, if set, and inside the working hours of
+        every attendee who has them.
+        """
+        if interval.window_start_ts is not None:
+            low = max(low, interval.window_start_ts)
+        if interval.window_end_ts is not None:
+            high = min(high, interval.window_end_ts)
+        if low >= high:
+            return []
+        stretches = [(low, high)]
+        schedules = {}
+        for attendee in resolve_attendees(interval.attendees, interval.creator) or ():
+            hours = self.working_hours.get(attendee, self.working_hours.get(DEFAULT_KEY))
+            if hours is not None:
+                schedules[id(hours)] = hours
+        for hours in schedules.values():
+            stretches = intersect_stretches(stretches, hours.stretches(low, high))
+        return stretches
+
     def find_nearest_slot(self, interval, step=60, search_window=86400*14):
-        # TODO: Add proper window limitations
+        """
+        Finds the nearest start time, earlier or later than interval.low and
+        on the same step grid, at which the interval clashes with no busy
+        interval of its attendees and fits inside one of its
+        allowed_stretches(). Earlier slots win ties.
+
+        Instead of probing every step, each probe jumps straight past the
+        busy intervals it hit, and time outside the allowed stretches is
+        skipped whole, so the cost grows with the number of intervals and
+        stretches crossed rather than the number of steps scanned.
+        Returns (low, high), or None if nothing is free inside search_window.
+        """
         duration = interval.high - interval.low
         original_start = interval.low
-        for offset in range(0, search_window + step, step):
-            # Try moving earlier
-            candidate_start_earlier = original_start - offset
-            candidate_interval_earlier = Interval(candidate_start_earlier,
-                                                  candidate_start_earlier + duration,
-                                                  interval.attendees)
-            
-            
-            if not self.interval_tree.search(candidate_interval_earlier):
-                return candidate_start_earlier, candidate_start_earlier + duration
-
-            candidate_start_later = original_start + offset
-            candidate_interval_later = Interval(candidate_start_later,
-                                                candidate_start_later + duration,
-                                                interval.attendees)
-            
-            if not self.interval_tree.search(candidate_interval_later):
-                return candidate_start_later, candidate_start_later + duration
+        stretches = self.allowed_stretches(interval, original_start - search_window,
+                                           original_start + search_window + duration)
+        stretch_ends = [end for _, end in stretches]
+
+        def fit_later(start):
+            # First grid start at or after `start` whose slot fits a stretch
+            for low, high in stretches[bisect.bisect_left(stretch_ends, start + duration):]:
+                candidate = original_start - ((original_start - max(start, low)) // step) * step
+                if candidate + duration <= high:
+                    return candidate
+            return None
+
+        def fit_earlier(start):
+            # Last grid start at or before `start` whose slot fits a stretch
+            for low, high in reversed(stretches[:bisect.bisect_right(stretch_ends, start + duration) + 1]):
+                candidate = original_start + ((min(start, high - duration) - original_start) // step) * step
+                if candidate >= low:
+                    return candidate
+            return None
+
+        earlier, later = fit_earlier(original_start), fit_later(original_start)
+        probes = 0
+        while earlier is not None or later is not None:
+            # Probe whichever candidate is nearer the original start
+            move_earlier = earlier is not None and (later is None or
+                                                    original_start - earlier <= later - original_start)
+            candidate_start = earlier if move_earlier else later
+            clashes = self.conflict_index.search_all(Interval(candidate_start,
+                                                               candidate_start + duration,
+                                                               interval.attendees,
+                                                               interval.attendee_mask))
+            probes += 1
+            if not clashes:
+                SLOTS_PROBED.inc(probes)
+                return candidate_start, candidate_start + duration
+
+            if candidate_start == earlier:
+                # Jump to the first grid point ending before every clash begins
+                min_low = min(x.interval.low for x in clashes)
+                earlier = fit_earlier(original_start
+                                      - ((original_start + duration - min_low) // step + 1) * step)
+            if candidate_start == later:
+                # Jump to the first grid point starting after every clash ends
+                max_high = max(x.interval.high for x in clashes)
+                later = fit_later(original_start + ((max_high - original_start) // step + 1) * step)
+        SLOTS_PROBED.inc(probes)
+        return None
             
 
 
-def reschedule_all_meetings(events):
-    scheduler = IntervalTreeScheduler(events)
-    interval_tree_nodes = scheduler.interval_tree.inorder()
-    intervals = [x.interval for x in interval_tree_nodes]
-    for interval in intervals:
-        interval.final_start_time = datetime.fromtimestamp(interval.low)
-        interval.final_end_time = datetime.fromtimestamp(interval.high)
-    return intervals
\ No newline at end of file
+def reschedule_all_meetings(events, backend="tree", working_hours=None, mode="greedy"):
+    """
+    Schedules events and returns their intervals in time order. Each
+    interval's final_start_time/final_end_time give its new slot in its
+    event's timezone. mode is one of SCHEDULING_MODES.
+    """
+    scheduler = IntervalTreeScheduler(events, backend, working_hours, mode)
+    return [x.interval for x in scheduler.interval_tree.iter_inorder()]
\ No newline at end of file
@@ -1,6 +1,7 @@
 from src.calendar_events import get_all_calendar_events_dummy
 from src.classes import Event
 from src.scheduling.interval_tree import *
+from datetime import timedelta
 
 def test_tree_creation():
     calendar_events = get_all_calendar_events_dummy()
@@ -80,6 +81,386 @@ def test_4():
     scheduler.insert_event(new_event)"""
     print(scheduler)
 
+def _label_event(summary, attendees):
+    # Distinguishes otherwise identical intervals, as deletes match on the event
+    return Event(attendees[0], datetime(2025, 1, 1), datetime(2025, 1, 1), summary, attendees)
+
+def _brute_force_slot(scheduler, interval, step=60, search_window=86400*14):
+    duration = interval.high - interval.low
+    for offset in range(0, search_window + step, step):
+        for start in (interval.low - offset, interval.low + offset):
+            candidate = Interval(start, start + duration, interval.attendees, interval.attendee_mask)
+            if not scheduler.interval_tree.search_all(candidate):
+                return start, start + duration
+
+def test_find_nearest_slot_matches_minute_scan():
+    import random
+    rng = random.Random(7)
+    users = ["a@x.com", "b@x.com", "c@x.com", "d@x.com"]
+    base = datetime(2025, 1, 6, 9, 0, 0)
+    events = []
+    for i in range(40):
+        start = base + timedelta(minutes=rng.randrange(0, 60 * 24 * 2, 15))
+        events.append(Event(users[0], start, start + timedelta(minutes=rng.choice([30, 45, 60, 90])),
+                            f"Event {i}", rng.sample(users, 2), priority=rng.randint(1, 4)))
+    scheduler = IntervalTreeScheduler(events)
+    for i in range(40):
+        start = base + timedelta(minutes=rng.randrange(0, 60 * 24 * 2, 7))
+        probe = Interval.from_event(Event(users[0], start, start + timedelta(minutes=50),
+                                          "Probe", rng.sample(users, 2)), scheduler.registry)
+        expected = _brute_force_slot(scheduler, probe)
+        assert scheduler.find_nearest_slot(probe) == expected
+
+def test_attendee_index_matches_global_tree():
+    import random
+    rng = random.Random(11)
+    users = [f"user{i}@x.com" for i in range(8)]
+    tree = IntervalTree()
+    index = AttendeeIntervalIndex()
+    for i in range(200):
+        low = rng.randrange(0, 10000)
+        attendees = rng.sample(users, 3)
+        interval = Interval(low, low + rng.randrange(10, 300), attendees,
+                            event=_label_event(f"Event {i}", attendees))
+        tree.insert(interval)
+        index.insert(interval)
+    for _ in range(100):
+        low = rng.randrange(0, 10000)
+        probe = Interval(low, low + 100, rng.sample(users, 2))
+        expected = {id(x.interval) for x in tree.search_all(probe)}
+        assert {id(x.interval) for x in index.search_all(probe)} == expected
+        assert (index.search(probe) is None) == (not expected)
+
+def test_attendee_masks():
+    registry = AttendeeRegistry()
+    a = Interval(0, 10, ["a@x.com", "b@x.com"], registry=registry)
+    b = Interval(5, 15, ["b@x.com", "a@x.com"], registry=registry)
+    c = Interval(5, 15, ["c@x.com"], registry=registry)
+    assert a.attendee_mask == b.attendee_mask
+    assert list(iter_attendee_ids(a.attendee_mask)) == [0, 1]
+    assert a.overlaps(b) and not a.overlaps(c)
+    # An interval without attendees clashes with anyone in its time range
+    assert Interval(5, 15).overlaps(c)
+
+def _check_red_black(tree):
+    """Returns the black height, asserting colours, ordering and max."""
+    def check(node, low_bound):
+        if node == tree.NIL:
+            return 1, float('-inf')
+        if node.color == RED:
+            assert node.left.color == BLACK and node.right.color == BLACK
+        assert node.interval.low >= low_bound
+        left_height, left_max = check(node.left, low_bound)
+        right_height, right_max = check(node.right, node.interval.low)
+        assert left_height == right_height
+        assert node.max == max(node.interval.high, left_max, right_max)
+        return left_height + (node.color == BLACK), node.max
+    assert tree.root.color == BLACK
+    return check(tree.root, float('-inf'))[0]
+
+def test_bulk_load_is_valid_red_black_tree():
+    for n in range(0, 70):
+        intervals = [Interval(i // 2, i // 2 + (i * 7) % 13) for i in range(n)]
+        tree = IntervalTree.from_sorted(intervals)
+        _check_red_black(tree)
+        assert [x.interval for x in tree.iter_inorder()] == intervals
+
+def test_bulk_loaded_tree_supports_updates():
+    intervals = [Interval(i // 3, i // 3 + 5, ["a@x.com"], event=_label_event(f"Event {i}", ["a@x.com"]))
+                 for i in range(50)]
+    tree = IntervalTree.from_sorted(intervals)
+    # Equal lows must still be found and deleted
+    for interval in intervals[::2]:
+        tree.delete(interval)
+        _check_red_black(tree)
+    remaining = {id(x.interval) for x in tree.inorder()}
+    assert remaining == {id(x) for x in intervals[1::2]}
+
+def test_iter_search_all_can_stop_early():
+    tree = IntervalTree()
+    for low in range(0, 100, 10):
+        tree.insert(Interval(low, low + 15))
+    hits = tree.iter_search_all(Interval(12, 40))
+    assert next(hits).interval.low == 0
+    assert [x.interval.low for x in tree.search_all(Interval(12, 40))] == [0, 10, 20, 30, 40]
+
+def _random_events(seed, count, users, days=2):
+    import random
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 6, 9, 0, 0)
+    events = []
+    for i in range(count):
+        start = base + timedelta(minutes=rng.randrange(0, 60 * 24 * days, 15))
+        events.append(Event(users[0], start, start + timedelta(minutes=rng.choice([30, 45, 60, 90])),
+                            f"Event {i}", rng.sample(users, 2), priority=rng.randint(1, 4)))
+    return events
+
+def test_array_backend_matches_tree_backend():
+    users = [f"user{i}@x.com" for i in range(6)]
+    tree_result = reschedule_all_meetings(_random_events(3, 60, users), backend="tree")
+    array_result = reschedule_all_meetings(_random_events(3, 60, users), backend="array")
+    assert [(x.summary, x.low, x.high) for x in tree_result] == \
+           [(x.summary, x.low, x.high) for x in array_result]
+
+def test_array_backend_batch_conflicts():
+    import random
+    rng = random.Random(5)
+    users = [f"user{i}@x.com" for i in range(6)]
+    tree_scheduler = IntervalTreeScheduler(_random_events(9, 40, users))
+    array_scheduler = IntervalTreeScheduler(_random_events(9, 40, users), backend="array")
+    base = get_unix_time(datetime(2025, 1, 6, 9, 0, 0))
+    starts = [base + rng.randrange(0, 86400 * 2, 300) for _ in range(200)]
+    ends = [start + 1800 for start in starts]
+    attendees = users[:2]
+    expected = tree_scheduler.find_conflicting_windows(starts, ends, attendees)
+    assert array_scheduler.find_conflicting_windows(starts, ends, attendees) == expected
+    assert any(expected) and not all(expected)
+
+def test_events_without_attendees_clash_with_everyone():
+    base = datetime(2025, 1, 6, 10, 0, 0)
+    for backend in ("tree", "array"):
+        events = [Event("a@x.com", base, base + timedelta(hours=1), "Review", ["a@x.com", "b@x.com"],
+                        priority=1),
+                  Event("c@x.com", base, base + timedelta(hours=1), "Interview", ["c@x.com"], priority=1),
+                  Event("d@x.com", base + timedelta(minutes=30), base + timedelta(minutes=90),
+                        "Fire drill", None, priority=4)]
+        assert sorted(find_event_conflicts(events)) == [(0, 2), (1, 2)]
+        result = reschedule_all_meetings(events, backend=backend)
+        moved = {x.summary for x in result if x.low != x.start_ts}
+        assert moved == {"Fire drill"}, backend
+        assert not [(x, y) for x in result for y in result if x is not y and x.overlaps(y)]
+
+        scheduler = IntervalTreeScheduler(events[:2], backend)
+        scheduler.insert_event(events[2])
+        drill = next(x.interval for x in scheduler.interval_tree.iter_inorder()
+                     if x.interval.summary == "Fire drill")
+        scheduler.remove_interval(drill)
+        assert [x.interval.summary for x in scheduler.interval_tree.iter_inorder()] == ["Review", "Interview"]
+
+def test_array_backend_keeps_wildcards_past_64_attendees():
+    base = datetime(2025, 1, 6, 10, 0, 0)
+    users = [f"user{i}@x.com" for i in range(70)]
+    # One short event per day for each of the first 64 users, so the store
+    # starts out one mask word wide, plus an event without attendees
+    events = [Event(user, base + timedelta(days=i + 1), base + timedelta(days=i + 1, minutes=30),
+                    f"Event {i}", [user], priority=2) for i, user in enumerate(users[:64])]
+    events.append(Event("d@x.com", base, base + timedelta(hours=1), "Fire drill", None, priority=1))
+    results = {}
+    for backend in ("tree", "array"):
+        scheduler = IntervalTreeScheduler(events, backend)
+        # Attendees past id 63 widen the masks after the fire drill is stored
+        scheduler.insert_event(Event("user69@x.com", base, base + timedelta(minutes=30), "Mtg",
+                                     users[64:], priority=3))
+        results[backend] = [(x.interval.summary, x.interval.low, x.interval.high)
+                            for x in scheduler.interval_tree.iter_inorder()]
+    assert results["array"] == results["tree"]
+    mtg = next(x for x in results["array"] if x[0] == "Mtg")
+    assert mtg[1] != get_unix_time(base)
+
+def test_solo_events_of_different_users_do_not_clash():
+    base = datetime(2025, 1, 6, 10, 0, 0)
+    events = [Event("a@x.com", base, base + timedelta(hours=1), "Focus time", ["SELF"], priority=3),
+              Event("b@x.com", base, base + timedelta(hours=1), "Gym", ["SELF"], priority=4),
+              Event("c@x.com", base, base + timedelta(hours=1), "Sync", ["c@x.com", "a@x.com"], priority=1)]
+    # Only a@x.com's own event clashes with the meeting a@x.com attends
+    assert find_event_conflicts(events) == [(0, 2)]
+    result = reschedule_all_meetings(events)
+    assert {x.summary for x in result if x.low != x.start_ts} == {"Focus time"}
+
+def test_sweep_line_finds_all_conflicting_pairs():
+    users = [f"user{i}@x.com" for i in range(5)]
+    events = _random_events(21, 80, users)
+    registry = AttendeeRegistry()
+    intervals = [Interval.from_event(event, registry) for event in events]
+    expected = sorted((i, j) for i in range(len(intervals)) for j in range(i + 1, len(intervals))
+                      if intervals[i].overlaps(intervals[j]))
+    assert sorted(find_event_conflicts(events)) == expected
+    assert expected
+
+def test_conflict_free_events_keep_their_slots():
+    events = get_all_calendar_events_dummy(0)
+    scheduler = IntervalTreeScheduler(events)
+    assert scheduler.conflicting_pairs == [(1, 2)]
+    meeting = next(x.interval for x in scheduler.interval_tree.inorder()
+                   if x.interval.summary == "Meeting with team")
+    assert meeting.low == get_unix_time(events[0].start_time)
+
+def _schedule(events):
+    return sorted((x.summary, x.final_start_time, x.final_end_time) for x in events)
+
+def test_resident_scheduler_matches_fresh_schedule():
+    from src.scheduling.incremental import ResidentScheduler
+    resident = ResidentScheduler()
+    resident.apply(resident.diff(get_all_calendar_events_dummy(2)))
+    new_event = Event("usertwo.amd@gmail.com", datetime(2025, 1, 1, 9, 30, 0),
+                      datetime(2025, 1, 1, 10, 30, 0), "Inserted Event",
+                      ["userthree.amd@gmail.com", "usertwo.amd@gmail.com"], priority=1)
+    fresh = reschedule_all_meetings(get_all_calendar_events_dummy(2) + [new_event])
+    before = _schedule(resident.schedule_new_event(new_event))
+    assert before == _schedule(fresh)
+    # The new event is rolled back, so asking again gives the same answer
+    assert _schedule(resident.schedule_new_event(new_event)) == before
+    assert len(resident.scheduler.interval_tree.inorder()) == 4
+
+def test_resident_scheduler_applies_changes():
+    from src.scheduling.incremental import ResidentScheduler
+    resident = ResidentScheduler()
+    resident.apply(resident.diff(get_all_calendar_events_dummy(0)))
+    tea_break = next(x for x in resident.intervals.values() if x.summary == "Tea break")
+    assert tea_break.low != get_unix_time(datetime(2025, 1, 2, 12, 30, 0))
+
+    # Cancelling the project discussion lets the tea break return to its slot
+    events = [x for x in get_all_calendar_events_dummy(0) if x.summary != "Project discussion"]
+    changes = resident.diff(events)
+    assert (len(changes.added), len(changes.changed), len(changes.removed)) == (0, 0, 1)
+    resident.apply(changes)
+    assert tea_break.low == get_unix_time(datetime(2025, 1, 2, 12, 30, 0))
+    assert not resident.displaced
+
+def test_resident_scheduler_cancels_duplicate_events():
+    from src.scheduling.incremental import ResidentScheduler
+    day = datetime(2025, 1, 6)
+
+    def calendar(lunches):
+        # Id-less events that are identical in every field
+        return [Event("a@x.com", day.replace(hour=12), day.replace(hour=13), "Lunch", ["SELF"])
+                for _ in range(lunches)] + [
+            Event("a@x.com", day.replace(hour=9), day.replace(hour=10), "Standup", ["a@x.com", "b@x.com"]),
+            Event("c@x.com", day.replace(hour=15), day.replace(hour=16), "Fire drill", None)]
+
+    resident = ResidentScheduler()
+    for lunches in (2, 3, 1, 0):
+        resident.apply(resident.diff(calendar(lunches)))
+        assert len(resident.events) == lunches + 2
+        assert len(resident.scheduler.interval_tree.inorder()) == lunches + 2
+    assert resident.diff(calendar(0))[:3] == ([], [], [])
+
+def test_synthetic_calendar_generator():
+    from src.scheduling.benchmark import generate_calendar
+    free = generate_calendar(200, conflict_density=0.0, seed=1)
+    assert len(free) == 200 and not find_event_conflicts(free)
+    busy = generate_calendar(200, conflict_density=0.5, seed=1)
+    assert len(find_event_conflicts(busy)) >= 50
+    assert {x.priority for x in busy} <= {1.0, 2.0, 3.0, 4.0}
+
+def test_benchmark_results_and_regression_check():
+    from src.scheduling.benchmark import compare_results, run_benchmarks
+    results = run_benchmarks([10, 30], label="test", ops=5, repeat=1)
+    assert {(x["benchmark"], x["n_events"]) for x in results} == {
+        (name, n) for n in (10, 30)
+        for name in ("construction", "insert_event", "find_nearest_slot", "reschedule_all_meetings",
+                     "reschedule_all_meetings_batch")}
+    slower = [dict(x, us_per_op=x["us_per_op"] * 2) for x in results]
+    assert len(compare_results(results, slower)) == len(results)
+    assert compare_results(results, results) == []
+
+def test_intervals_are_views_and_keep_event_timezone():
+    from datetime import timezone
+    from src.scheduling.incremental import ResidentScheduler
+    ist = timezone(timedelta(hours=5, minutes=30))
+    a = Event("a@x.com", datetime(2025, 1, 2, 10, tzinfo=ist), datetime(2025, 1, 2, 11, tzinfo=ist),
+              "Client call", ["a@x.com"], priority=1)
+    b = Event("a@x.com", datetime(2025, 1, 2, 10, 30, tzinfo=ist), datetime(2025, 1, 2, 11, tzinfo=ist),
+              "Tea break", ["a@x.com"], priority=4)
+    assert not hasattr(a, "__dict__") and a.final_start_time is None and a.window_start_time is None
+    assert a.start_ts == int(datetime(2025, 1, 2, 10, tzinfo=ist).timestamp())
+
+    interval = Interval.from_event(a)
+    assert not hasattr(interval, "__dict__") and interval.event is a
+    a.priority = 2
+    assert interval.priority == 2 and interval.summary == "Client call"
+
+    moved = next(x for x in reschedule_all_meetings([a, b]) if x.summary == "Tea break")
+    assert moved.final_start_time == datetime(2025, 1, 2, 11, 1, tzinfo=ist)
+    assert moved.final_start_time.utcoffset() == timedelta(hours=5, minutes=30)
+    # The event itself still holds its original time
+    assert b.start_time == datetime(2025, 1, 2, 10, 30, tzinfo=ist) and b.start_time.tzinfo == ist
+
+    resident = ResidentScheduler()
+    resident.apply(resident.diff([a]))
+    scheduled = resident.schedule_new_event(b)
+    assert {x.summary: x.final_start_time.isoformat() for x in scheduled} == {
+        "Client call": "2025-01-02T10:00:00+05:30", "Tea break": "2025-01-02T11:01:00+05:30"}
+
+def test_slot_search_honours_windows_and_working_hours():
+    from datetime import date, time, timezone
+    from src.metrics import SLOTS_PROBED
+    from src.scheduling.working_hours import WorkingHours
+    utc = timezone.utc
+    at = lambda day, hour, minute=0: datetime(2025, 1, day, hour, minute, tzinfo=utc)
+    hours = {"*": WorkingHours(time(9), time(17), range(5), [date(2025, 1, 13)], utc)}
+    # Friday 2025-01-10 is busy from 15:00 until close
+    busy = Event("a@x.com", at(10, 15), at(10, 17), "Client call", ["a@x.com"], priority=1)
+    scheduler = IntervalTreeScheduler([busy], working_hours=hours)
+
+    def slot(start, end, window=None, attendees=("a@x.com",)):
+        event = Event("a@x.com", start, end, "Review", list(attendees), priority=3)
+        if window:
+            event.window_start_time, event.window_end_time = window
+        found = scheduler.find_nearest_slot(Interval.from_event(event, scheduler.registry))
+        return found and tuple(datetime.fromtimestamp(x, utc) for x in found)
+
+    # Earlier on Friday is nearest and inside working hours
+    assert slot(at(10, 16), at(10, 17)) == (at(10, 13, 59), at(10, 14, 59))
+    # Only Monday onwards allowed: the weekend and the excluded Monday are skipped
+    assert slot(at(10, 16), at(10, 17), (at(10, 16), at(20, 0))) == (at(14, 9), at(14, 10))
+    # Nothing fits: answered without probing every minute of the window
+    probed = SLOTS_PROBED.value
+    assert slot(at(10, 15), at(10, 17), (at(10, 15), at(10, 17))) is None
+    # Longer than any working day
+    assert slot(at(10, 8), at(10, 17, 30), (at(6, 0), at(20, 0))) is None
+    assert SLOTS_PROBED.value - probed <= 2
+
+    # A clashing event with no slot in its window stays where it is
+    standup = Event("a@x.com", at(10, 15, 30), at(10, 16), "Standup", ["a@x.com"], priority=4)
+    standup.window_start_time, standup.window_end_time = at(10, 15), at(10, 17)
+    assert scheduler.insert_event(standup).final_start_time == at(10, 15, 30)
+
+def test_batch_mode_is_order_independent_and_conflict_free():
+    from src.scheduling.benchmark import generate_calendar
+    events = generate_calendar(300, n_attendees=8, conflict_density=0.4, seed=5)
+    placed = reschedule_all_meetings(events, mode="batch")
+    assert find_conflicting_pairs(placed) == []
+    # The most important clashing event is placed first and keeps its slot
+    clashing = {i for pair in find_event_conflicts(events) for i in pair}
+    first = min(clashing, key=lambda i: (events[i].priority, events[i].start_ts, i))
+    assert next(x for x in placed if x.event is events[first]).low == events[first].start_ts
+
+    spans = lambda intervals: sorted((x.summary, x.low, x.high) for x in intervals)
+    assert spans(reschedule_all_meetings(list(reversed(events)), mode="batch")) == spans(placed)
+    greedy = reschedule_all_meetings(events)
+    assert total_displacement(placed) <= total_displacement(greedy)
+    try:
+        IntervalTreeScheduler(events, mode="optimal")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Unknown modes should be rejected")
+
+def test_components_schedule_like_the_whole_calendar():
+    from src.scheduling.benchmark import generate_calendar
+    from src.scheduling.components import attendee_components, reschedule_by_component
+    # Four teams that never share an attendee, plus one event nobody clashes with
+    events = []
+    for team in range(4):
+        for event in generate_calendar(60, n_attendees=4, conflict_density=0.3, seed=team):
+            event.attendees = [f"team{team}-{x}" for x in event.attendees]
+            events.append(event)
+    events.append(Event("solo@x.com", datetime(2025, 1, 6, 9), datetime(2025, 1, 6, 10), "Solo", ["solo@x.com"]))
+    # Solo events of different users stay apart even though both say "SELF"
+    for user in ("x@x.com", "y@x.com"):
+        events.append(Event(user, datetime(2025, 1, 6, 9), datetime(2025, 1, 6, 10), "Focus", ["SELF"]))
+    components = attendee_components(events)
+    assert sorted(map(len, components)) == [1, 1, 1, 60, 60, 60, 60]
+    assert all(component == sorted(component) for component in components)
+
+    spans = lambda intervals: sorted((x.summary, x.creator, x.low, x.high) for x in intervals)
+    for mode in ("greedy", "batch"):
+        expected = spans(reschedule_all_meetings(events, mode=mode))
+        assert spans(reschedule_by_component(events, mode=mode, max_workers=1)) == expected
+        assert spans(reschedule_by_component(events, mode=mode, max_workers=2,
+                                             min_parallel_events=0)) == expected
+
 if __name__ == "__main__":
     #test_tree_creation()
     #test_event_insertion_high_priority()
@@ -0,0 +1,93 @@
+import json
+import os
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from typing import Dict, Iterable, List, Tuple
+
+# JSON file of working hours per attendee email, "*" for everyone else:
+# {"*": {"start": "09:00", "end": "18:00", "days": [0, 1, 2, 3, 4],
+#        "excluded_dates": ["2025-08-15"], "utc_offset": "+05:30"}}
+WORKING_HOURS_PATH = os.environ.get("WORKING_HOURS_PATH", "./config/working_hours.json")
+
+# Key of the entry applying to attendees without one of their own
+DEFAULT_KEY = "*"
+
+Stretch = Tuple[int, int]
+
+
+class WorkingHours:
+    """
+    When one attendee can be booked: a daily start and end time in their
+    timezone, on the given weekdays (0 = Monday), minus excluded dates. An
+    end at or before the start runs past midnight.
+    """
+    def __init__(self, start: time = time(9, 0), end: time = time(18, 0),
+                 weekdays: Iterable[int] = range(5), excluded_dates: Iterable[date] = (),
+                 tz: tzinfo = None):
+        self.start = start
+        self.end = end
+        self.weekdays = frozenset(weekdays)
+        self.excluded_dates = frozenset(excluded_dates)
+        self.tz = tz
+
+    def stretches(self, low: int, high: int) -> List[Stretch]:
+        """
+        Working stretches overlapping [low, high] as sorted (start, end)
+        unix second pairs, clipped to [low, high].
+        """
+        first_day = datetime.fromtimestamp(low, self.tz).date() - timedelta(days=1)
+        last_day = datetime.fromtimestamp(high, self.tz).date()
+        overnight = self.end <= self.start
+        result = []
+        day = first_day
+        while day <= last_day:
+            if day.weekday() in self.weekdays and day not in self.excluded_dates:
+                start = int(datetime.combine(day, self.start, self.tz).timestamp())
+                end_day = day + timedelta(days=1) if overnight else day
+                end = int(datetime.combine(end_day, self.end, self.tz).timestamp())
+                start, end = max(start, low), min(end, high)
+                if start < end:
+                    result.append((start, end))
+            day += timedelta(days=1)
+        return result
+
+
+def intersect_stretches(a: List[Stretch], b: List[Stretch]) -> List[Stretch]:
+    """Intersection of two sorted lists of disjoint stretches."""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start, end = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if start < end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def _parse_offset(text: str) -> tzinfo:
+    sign = -1 if text.startswith("-") else 1
+    hours, minutes = text.lstrip("+-").split(":")
+    return timezone(sign * timedelta(hours=int(hours), minutes=int(minutes)))
+
+
+def working_hours_from_dict(config: dict) -> WorkingHours:
+    return WorkingHours(
+        start=time.fromisoformat(config.get("start", "09:00")),
+        end=time.fromisoformat(config.get("end", "18:00")),
+        weekdays=config.get("days", range(5)),
+        excluded_dates=[date.fromisoformat(x) for x in config.get("excluded_dates", [])],
+        tz=_parse_offset(config["utc_offset"]) if "utc_offset" in config else None,
+    )
+
+
+def load_working_hours(path=WORKING_HOURS_PATH) -> Dict[str, WorkingHours]:
+    """
+    Reads per-attendee working hours from a JSON file. A missing file
+    means nobody has working hours, so no time is off limits.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {user: working_hours_from_dict(config) for user, config in json.load(f).items()}
@@ -0,0 +1,70 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Tuple
+from src.metrics import SHARDS_EVICTED
+from src.scheduling.incremental import ResidentScheduler
+
+# Resident events kept across all shards before the least recently used
+# shards are dropped
+SHARD_MEMORY_CAP_MB = float(os.environ.get("SHARD_MEMORY_CAP_MB", "256"))
+
+# Measured size of one resident event: the Event with its attendee list,
+# its interval and tree node, and the scheduler's bookkeeping
+SHARD_BYTES_PER_EVENT = int(os.environ.get("SHARD_BYTES_PER_EVENT", "1500"))
+
+
+def shard_key(data: dict) -> Tuple[str, ...]:
+    """
+    The calendars a /receive request schedules across: the sender and
+    every attendee in the payload, sorted so attendee order does not matter.
+    """
+    users = {attendee["email"] for attendee in data.get("Attendees", [])}
+    users.add(data["From"])
+    return tuple(sorted(users))
+
+
+class Shard:
+    """Scheduling state for one set of users, kept warm between requests."""
+    def __init__(self, users: Tuple[str, ...], backend: str = "tree", working_hours=None):
+        self.users = list(users)
+        self.scheduler = ResidentScheduler(backend, working_hours)
+
+    def estimated_bytes(self) -> int:
+        return len(self.scheduler.events) * SHARD_BYTES_PER_EVENT
+
+
+class ShardRegistry:
+    """
+    Shards by user set, created on first use. Once their resident events
+    add up to more than memory_cap_mb, the least recently used shards are
+    dropped; a dropped shard is rebuilt from the calendars by its next
+    request. A request still holding a dropped shard finishes with it.
+    """
+    def __init__(self, memory_cap_mb: float = SHARD_MEMORY_CAP_MB, backend: str = "tree",
+                 working_hours=None):
+        self.memory_cap_bytes = memory_cap_mb * 1024 * 1024
+        self.backend = backend
+        self.working_hours = working_hours
+        self.shards: "OrderedDict[Tuple[str, ...], Shard]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Tuple[str, ...]) -> Shard:
+        with self.lock:
+            shard = self.shards.get(key)
+            if shard is None:
+                shard = self.shards[key] = Shard(key, self.backend, self.working_hours)
+            self.shards.move_to_end(key)
+            return shard
+
+    def evict(self):
+        """
+        Drops least recently used shards until the rest fit under the cap.
+        The most recently used shard is always kept, however large.
+        """
+        with self.lock:
+            total = sum(shard.estimated_bytes() for shard in self.shards.values())
+            while total > self.memory_cap_bytes and len(self.shards) > 1:
+                _, shard = self.shards.popitem(last=False)
+                total -= shard.estimated_bytes()
+                SHARDS_EVICTED.inc()
@@ -1,4 +1,5 @@
-from scheduling.interval_tree import *
+from contextlib import contextmanager
+from src.scheduling.interval_tree import *
 def test_insert_and_search():
     tree = IntervalTree()
     intervals = [
@@ -59,9 +60,645 @@ def test_max_field_propagation():
     else:
         raise AssertionError("Expected node with interval [10, 15] not found")
 
+def test_priority_cache():
+    from datetime import datetime
+    from src.classes import Event
+    from src.metrics import PRIORITY_CACHE_HITS, PRIORITY_CACHE_MISSES
+    from src.priority_cache import PriorityCache
+
+    def event(summary, priority=None, event_id=None, etag=None):
+        return Event("a@x.com", datetime(2025, 1, 1, 9), datetime(2025, 1, 1, 10),
+                     summary, ["a@x.com"], priority, event_id=event_id, etag=etag)
+
+    cache = PriorityCache(":memory:", max_entries=2)
+    hits, misses = PRIORITY_CACHE_HITS.value, PRIORITY_CACHE_MISSES.value
+    cache.put_many([event("Client  Meeting", 1.0), event("Lunch", 4.0, "id1", "etag1")])
+    # Summaries are normalized; ids and etags must match when present
+    assert cache.get_many([event("client meeting"), event("Lunch", event_id="id1", etag="etag1"),
+                           event("Lunch", event_id="id1", etag="etag2")]) == [1.0, 4.0, None]
+    assert cache.stats() == {"hits": 2, "misses": 1}
+    # Also exported on /metrics
+    assert (PRIORITY_CACHE_HITS.value - hits, PRIORITY_CACHE_MISSES.value - misses) == (2, 1)
+
+    # Least recently used entry goes first
+    cache.get_many([event("Lunch", event_id="id1", etag="etag1")])
+    cache.put_many([event("Standup", 3.0)])
+    assert cache.get_many([event("client meeting"), event("Standup")]) == [None, 3.0]
+
+def test_priority_rules_send_only_uncertain_summaries_to_llm():
+    from datetime import datetime
+    from pydantic_ai.messages import ModelResponse, TextPart
+    from pydantic_ai.models.function import FunctionModel
+    from src.classes import Event
+    from src.event_loop import run_sync
+    from src.metrics import PRIORITY_RULE_HITS
+    from src.priority_cache import PriorityCache
+    from src.priority_rules import classify_summary
+    import src.calendar_priority as calendar_priority
+
+    assert classify_summary("Interview with candidate") == (1.0, 0.9)
+    assert classify_summary("URGENT: prod outage") == (2.0, 0.9)
+    assert classify_summary("Tea break")[0] == 4.0
+    assert classify_summary("Meeting with team")[1] < 0.75
+    # Rules pointing different ways are not trusted
+    assert classify_summary("Urgent client call")[1] < 0.75
+    assert classify_summary("Quarterly thing") == (3.0, 0.0)
+
+    prompts = []
+    def fake_llm(messages, info):
+        prompts.append(messages[-1].parts[-1].content)
+        return ModelResponse(parts=[TextPart("2, 3")])
+
+    events = [Event("a@x.com", datetime(2025, 1, 1, 9), datetime(2025, 1, 1, 10), summary, ["a@x.com"])
+              for summary in ("Client demo", "Tea break", "Quarterly thing", "Meeting with team")]
+    saved = calendar_priority._priority_cache
+    calendar_priority._priority_cache = PriorityCache(":memory:")
+    rule_hits = PRIORITY_RULE_HITS.value
+    try:
+        with calendar_priority.priority_agent.override(model=FunctionModel(fake_llm)):
+            run_sync(calendar_priority.set_event_priorities(events))
+    finally:
+        calendar_priority._priority_cache = saved
+    assert [x.priority for x in events] == [1.0, 4.0, 2.0, 3.0]
+    assert PRIORITY_RULE_HITS.value - rule_hits == 2
+    assert len(prompts) == 1
+    assert "Quarterly thing" in prompts[0] and "Meeting with team" in prompts[0]
+    assert "Client demo" not in prompts[0]
+
+def test_priority_chunks_run_concurrently_and_retry_alone():
+    import asyncio
+    import re
+    from datetime import datetime
+    from pydantic_ai.messages import ModelResponse, TextPart
+    from pydantic_ai.models.function import FunctionModel
+    from src.classes import Event
+    from src.event_loop import run_sync
+    import src.calendar_priority as calendar_priority
+
+    calls = []
+    in_flight = [0, 0]  # current, peak
+    async def fake_llm(messages, info):
+        prompt = messages[-1].parts[-1].content
+        first = re.search(r"Event 1: Summary (\d+)", prompt).group(1)
+        count = len(re.findall(r"Event \d+:", prompt))
+        calls.append(first)
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight)
+        await asyncio.sleep(0.05)
+        in_flight[0] -= 1
+        if first == "10" and calls.count(first) == 1:
+            return ModelResponse(parts=[TextPart("2, 2")])  # miscounted, retried
+        if first == "20":
+            return ModelResponse(parts=[TextPart("7, " * (count - 1) + "7")])  # always invalid
+        return ModelResponse(parts=[TextPart(", ".join(["2"] * count))])
+
+    events = [Event("a@x.com", datetime(2025, 1, 1, 9), datetime(2025, 1, 1, 10), f"Summary {i}",
+                    ["a@x.com"]) for i in range(25)]
+    saved = calendar_priority.CHUNK_SIZE, calendar_priority.CONCURRENCY
+    calendar_priority.CHUNK_SIZE, calendar_priority.CONCURRENCY = 10, 2
+    try:
+        with calendar_priority.priority_agent.override(model=FunctionModel(fake_llm)):
+            classified = run_sync(calendar_priority.classify_event_priorities(events))
+    finally:
+        calendar_priority.CHUNK_SIZE, calendar_priority.CONCURRENCY = saved
+    assert sorted(calls) == ["0", "10", "10", "20", "20"]
+    assert in_flight[1] == 2
+    assert classified == events[:20]
+    assert [x.priority for x in events] == [2.0] * 20 + [3.0] * 5
+
+@contextmanager
+def _patched(module, **values):
+    """Sets module attributes for the duration of the block."""
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+def _standup(name):
+    return {"id": f"{name}-1", "etag": "1", "summary": f"Standup {name}",
+            "creator": {"email": f"{name}@x.com"},
+            "start": {"dateTime": "2025-01-01T09:00:00+05:30"},
+            "end": {"dateTime": "2025-01-01T09:30:00+05:30"}}
+
+def _write_body(handler, name, body):
+    handler.wfile.write(body)
+
+@contextmanager
+def _fake_calendar(names, items_for, write_body=_write_body):
+    """
+    Serves a fake Calendar API on localhost, writes a token for each user
+    name (the part of the email before "@") and points calendar_events at
+    both, with a fresh in-memory event store. items_for(name) lists the
+    user's items; write_body(handler, name, body) sends the response body.
+    """
+    import json
+    import tempfile
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from pathlib import Path
+    import src.calendar_events as calendar_events
+    from src.event_store import EventStore
+
+    class FakeCalendar(BaseHTTPRequestHandler):
+        def do_GET(self):
+            name = self.headers["Authorization"].split()[-1]
+            body = json.dumps({"items": items_for(name)}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            write_body(self, name, body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCalendar)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as keys:
+        for name in names:
+            (Path(keys) / f"{name}.token").write_text(json.dumps({
+                "token": name, "refresh_token": "r", "client_id": "c", "client_secret": "s",
+                "expiry": "2999-01-01T00:00:00Z"}))
+        try:
+            with _patched(calendar_events, KEYS_PATH=Path(keys),
+                          CALENDAR_API_ENDPOINT=f"http://127.0.0.1:{server.server_port}",
+                          _event_store=EventStore(":memory:")):
+                yield
+        finally:
+            server.shutdown()
+
+def test_concurrent_calendar_fetch_against_fake_endpoint():
+    import threading
+    import src.calendar_events as calendar_events
+    from src.metrics import render_metrics
+
+    # Every response waits until all three fetches are in flight, so they
+    # only come back if the fetches run concurrently
+    in_flight = threading.Barrier(3, timeout=10)
+    def items_for(name):
+        in_flight.wait()
+        return [_standup(name)]
+
+    users = [f"user{i}@x.com" for i in range(4)]
+    # user3 has no token: it is skipped and the rest still come back, in order
+    with _fake_calendar(["user0", "user1", "user2"], items_for):
+        events = calendar_events.get_all_calendar_events(users, "2025-01-01T00:00:00Z",
+                                                         "2025-01-08T00:00:00Z")
+    assert [event.event_id for event in events] == ["user0-1", "user1-1", "user2-1"]
+    # Fetch times are not split by user, so no address reaches /metrics
+    scrape = render_metrics()
+    assert "calendar_fetch_seconds_count " in scrape and "@x.com" not in scrape
+
+def test_calendar_fetch_deadline_skips_trickling_users():
+    import threading
+    import time
+    import src.calendar_events as calendar_events
+
+    done = threading.Event()
+    def write_body(handler, name, body):
+        if name != "slow":
+            handler.wfile.write(body)
+            return
+        # Every read returns well within the socket timeout; the whole body
+        # takes over ten seconds, far past the deadline
+        for i in range(len(body)):
+            if done.is_set():
+                return
+            handler.wfile.write(body[i:i + 1])
+            handler.wfile.flush()
+            time.sleep(0.05)
+
+    try:
+        with _fake_calendar(["fast", "slow"], lambda name: [_standup(name)], write_body):
+            events = calendar_events.get_all_calendar_events(["slow@x.com", "fast@x.com"],
+                                                             "2025-01-01T00:00:00Z",
+                                                             "2025-01-08T00:00:00Z", timeout=0.5)
+    finally:
+        done.set()
+    assert [event.event_id for event in events] == ["fast-1"]
+
+def test_incremental_calendar_sync():
+    import httplib2
+    from googleapiclient.errors import HttpError
+    from src.calendar_events import sync_user_calendar
+    from src.event_store import EventStore
+
+    def item(event_id, summary, status="confirmed"):
+        return {"id": event_id, "status": status, "summary": summary,
+                "start": {"dateTime": "2025-01-01T09:00:00+00:00"},
+                "end": {"dateTime": "2025-01-01T10:00:00+00:00"}}
+
+    class FakeCalendarService:
+        def __init__(self, responses):
+            self.responses = responses
+            self.calls = []
+
+        def events(self):
+            return self
+
+        def list(self, **params):
+            self.calls.append(params.get("syncToken"))
+            self.response = self.responses[params.get("syncToken")]
+            return self
+
+        def execute(self):
+            if isinstance(self.response, Exception):
+                raise self.response
+            return self.response
+
+    service = FakeCalendarService({
+        None: {"items": [item("a", "Standup"), item("b", "Review")], "nextSyncToken": "t1"},
+        "t1": {"items": [item("a", "Standup moved"), item("b", "Review", "cancelled")],
+               "nextSyncToken": "t2"},
+        "t2": HttpError(httplib2.Response({"status": 410}), b"Gone"),
+    })
+    store = EventStore(":memory:")
+    window = ("2025-01-01T00:00:00+00:00", "2025-01-02T00:00:00+00:00")
+
+    sync_user_calendar(service, "a@x.com", store)
+    assert [x["summary"] for x in store.get_items("a@x.com", *window)] == ["Standup", "Review"]
+    # Second fetch applies only the delta
+    sync_user_calendar(service, "a@x.com", store)
+    assert [x["summary"] for x in store.get_items("a@x.com", *window)] == ["Standup moved"]
+    # An expired token falls back to a full sync
+    sync_user_calendar(service, "a@x.com", store)
+    assert service.calls == [None, "t1", "t2", None]
+    assert [x["summary"] for x in store.get_items("a@x.com", *window)] == ["Standup", "Review"]
+    assert store.get_sync_token("a@x.com") == "t1"
+
+    # Items that ended before the window are pruned, the rest are kept
+    old = dict(item("c", "Last year's retro"), start={"dateTime": "2024-01-01T09:00:00+00:00"},
+               end={"dateTime": "2024-01-01T10:00:00+00:00"})
+    store.apply_items("a@x.com", [old], "t1")
+    assert store.prune("a@x.com", window[0]) == 1
+    assert store.get_items("a@x.com", "2024-01-01T00:00:00+00:00", window[1]) == \
+        store.get_items("a@x.com", *window)
+    assert len(store.get_items("a@x.com", *window)) == 2
+
+def test_pipeline_stages_run_concurrently():
+    import asyncio
+    import threading
+    from src.pipeline import Stage, run_stages
+
+    # Each of parse and fetch waits for the other to start, so run
+    # one after the other they would time out instead
+    log = []
+    parse_started, fetch_started = threading.Event(), threading.Event()
+
+    async def parse():
+        log.append("parse started")
+        parse_started.set()
+        assert await asyncio.to_thread(fetch_started.wait, 5)
+        log.append("parse finished")
+        return "event"
+
+    def fetch():
+        log.append("fetch started")
+        fetch_started.set()
+        assert parse_started.wait(5)
+        log.append("fetch finished")
+        return [1, 2]
+
+    async def prioritize(calendar):
+        log.append("prioritize started")
+        return [x * 10 for x in calendar]
+
+    def schedule(event, priorities):
+        log.append("schedule started")
+        return (event, priorities)
+
+    results = asyncio.run(run_stages([
+        Stage("parse", parse),
+        Stage("fetch", fetch),
+        Stage("prioritize", prioritize, ["fetch"]),
+        Stage("schedule", schedule, ["parse", "prioritize"]),
+    ]))
+    assert results["schedule"] == ("event", [10, 20])
+    # parse and fetch overlap; each later stage starts after its inputs finish
+    assert set(log[:2]) == {"parse started", "fetch started"}
+    assert log.index("fetch finished") < log.index("prioritize started")
+    assert log.index("parse finished") < log.index("schedule started")
+    assert log[-1] == "schedule started"
+
+async def _keep_priorities(events):
+    return events
+
+def _stub_pipeline(new_event, fetch, priorities=_keep_priorities, registry=None):
+    """
+    Patches src.main so requests run the real pipeline with the request
+    parser, calendar fetch and priority classifier replaced, on a fresh
+    ShardRegistry unless one is given.
+    """
+    import src.main as main
+    from src.shards import ShardRegistry
+    return _patched(main, get_new_event=new_event, set_event_priorities=priorities,
+                    get_all_calendar_events=fetch, shard_registry=registry or ShardRegistry())
+
+def test_meeting_assistant_pipeline():
+    import asyncio
+    from datetime import datetime
+    from src.classes import Event
+    from src.calendar_events import get_all_calendar_events_dummy
+    import src.main as main
+
+    async def fake_new_event(data):
+        # The calendar diff is applied while the request is still being parsed
+        shard = main.shard_registry.get(main.shard_key(data))
+        for _ in range(200):
+            if shard.scheduler.events:
+                break
+            await asyncio.sleep(0.01)
+        else:
+            raise AssertionError("tree_build waited for parse_request")
+        return Event("userone.amd@gmail.com", datetime(2025, 1, 2, 10, 0), datetime(2025, 1, 2, 10, 30),
+                     data["Subject"], ["usertwo.amd@gmail.com", "userone.amd@gmail.com"], priority=1.5)
+
+    data = {"Request_id": "1", "Location": "Office", "From": "userone.amd@gmail.com",
+            "Datetime": "02-01-2025T09:00:00", "Subject": "Sync", "EmailContent": "Quick sync"}
+    with _stub_pipeline(fake_new_event, lambda *args: get_all_calendar_events_dummy(0)):
+        output = main.your_meeting_assistant(data)
+    assert output["Request_id"] == "1" and output["Duration_mins"] == "30"
+    summaries = {x["Summary"] for user in output["Attendees"] for x in user["events"]}
+    assert summaries == {"Sync", "Meeting with team", "Project discussion", "Tea break"}
+
+    scrape = main.app.test_client().get("/metrics").get_data(as_text=True)
+    for stage in ("parse_request", "calendar_fetch", "prioritize", "tree_build",
+                  "reschedule", "format_output"):
+        assert f'meeting_assistant_stage_seconds_count{{stage="{stage}"}}' in scrape
+    assert "meeting_assistant_conflicts_found_total" in scrape
+
+def test_requests_route_to_per_team_shards():
+    from datetime import datetime
+    from src.classes import Event
+    from src.shards import SHARD_BYTES_PER_EVENT, ShardRegistry, shard_key
+    import src.main as main
+
+    def request(sender, *attendees):
+        return {"Request_id": sender, "Location": "Office", "From": sender,
+                "Datetime": "02-01-2025T09:00:00", "Subject": "Sync", "EmailContent": "Quick sync",
+                "Attendees": [{"email": x} for x in attendees]}
+
+    async def fake_new_event(data):
+        return Event(data["From"], datetime(2025, 1, 2, 10), datetime(2025, 1, 2, 10, 30),
+                     "Sync", list(shard_key(data)), priority=1.5)
+
+    fetched = []
+    def fake_fetch(users, start, end):
+        fetched.append(list(users))
+        return [Event(user, datetime(2025, 1, 2, 10), datetime(2025, 1, 2, 11),
+                      f"Standup {user}", [user], priority=2.0) for user in users]
+
+    assert shard_key(request("b@x.com", "c@x.com", "a@x.com")) == ("a@x.com", "b@x.com", "c@x.com")
+    # Room for the two-user team's calendar and nothing else
+    registry = ShardRegistry(memory_cap_mb=2.5 * SHARD_BYTES_PER_EVENT / 2**20)
+    with _stub_pipeline(fake_new_event, fake_fetch, registry=registry):
+        first = main.your_meeting_assistant(request("a@x.com", "b@x.com"))
+        team = registry.get(("a@x.com", "b@x.com"))
+        # Same team, attendees the other way round: the warm shard is reused
+        main.your_meeting_assistant(request("b@x.com", "a@x.com"))
+        assert registry.get(("a@x.com", "b@x.com")) is team
+        assert len(team.scheduler.events) == 2
+        # Another team only sees its own calendars and pushes the first one out
+        other = main.your_meeting_assistant(request("c@x.com"))
+    assert fetched == [["a@x.com", "b@x.com"], ["a@x.com", "b@x.com"], ["c@x.com"]]
+    assert {x["email"] for x in first["Attendees"]} == {"a@x.com", "b@x.com"}
+    assert {x["email"] for x in other["Attendees"]} == {"c@x.com"}
+    assert list(registry.shards) == [("c@x.com",)]
+
+def test_meetings_organised_outside_the_shard_block_their_attendees():
+    from datetime import datetime
+    import src.calendar_events as calendar_events
+    import src.main as main
+    from src.classes import Event
+
+    # Both a@x.com and b@x.com have a review on their calendars that
+    # c@x.com organised; c@x.com is not part of the request
+    review = {"id": "review-1", "etag": "1", "summary": "Design review",
+              "creator": {"email": "c@x.com"},
+              "attendees": [{"email": "a@x.com"}, {"email": "b@x.com"}, {"email": "c@x.com"}],
+              "start": {"dateTime": "2025-01-02T10:00:00"}, "end": {"dateTime": "2025-01-02T11:00:00"}}
+
+    async def fake_new_event(data):
+        return Event("a@x.com", datetime(2025, 1, 2, 10), datetime(2025, 1, 2, 10, 30),
+                     data["Subject"], ["b@x.com", "a@x.com"], priority=1.5)
+
+    async def fake_priorities(events):
+        for event in events:
+            event.priority = 1.0
+        return events
+
+    def fetch(users, start, end):
+        # The real fetch, over the week the review is in
+        return calendar_events.get_all_calendar_events(users, "2025-01-01T00:00:00",
+                                                       "2025-01-08T00:00:00")
+
+    data = {"Request_id": "1", "Location": "Office", "From": "a@x.com",
+            "Attendees": [{"email": "b@x.com"}], "Datetime": "02-01-2025T09:00:00",
+            "Subject": "Sync", "EmailContent": "Quick sync"}
+    with _fake_calendar(["a", "b"], lambda name: [review]), \
+            _stub_pipeline(fake_new_event, fetch, fake_priorities):
+        output = main.your_meeting_assistant(data)
+    timetable = {x["email"]: x["events"] for x in output["Attendees"]}
+    # The review appears once and the new meeting is moved off it
+    for user in ("a@x.com", "b@x.com"):
+        events = {x["Summary"]: (x["StartTime"], x["EndTime"]) for x in timetable[user]}
+        assert events["Design review"] == ("2025-01-02T10:00:00", "2025-01-02T11:00:00")
+        assert not "2025-01-02T10:00:00" <= events["Sync"][0] <= "2025-01-02T11:00:00"
+        assert len(timetable[user]) == 2
+
+def test_output_shares_event_records_and_streams_json():
+    import json
+    from datetime import datetime
+    from src.classes import Event
+    from src.output import format_to_output, iter_output_json
+
+    team = ["SELF", "b@x.com", "c@x.com"]
+    events = [Event("a@x.com", datetime(2025, 1, 2, 10), datetime(2025, 1, 2, 11), "Review", team),
+              Event("b@x.com", datetime(2025, 1, 2, 12), datetime(2025, 1, 2, 13), "Lunch", ["b@x.com"])]
+    for event in events:
+        event.final_start_time, event.final_end_time = event.start_time, event.end_time
+    data = {"Request_id": "1", "Location": "Office", "From": "a@x.com", "Datetime": "02-01-2025T09:00:00",
+            "Subject": "Review", "EmailContent": "Café at 10"}
+    result = format_to_output(events, data, events[0])
+
+    assert team == ["SELF", "b@x.com", "c@x.com"]
+    by_user = {x["email"]: x["events"] for x in result["Attendees"]}
+    assert list(by_user) == ["a@x.com", "b@x.com", "c@x.com"]
+    assert by_user["a@x.com"][0] is by_user["b@x.com"][0] is by_user["c@x.com"][0]
+    assert by_user["a@x.com"][0]["Attendees"] == ["a@x.com", "b@x.com", "c@x.com"]
+    assert [x["Summary"] for x in by_user["b@x.com"]] == ["Review", "Lunch"]
+
+    assert json.loads("".join(iter_output_json(result))) == result
+    assert json.loads("".join(iter_output_json({"Request_id": "1"}))) == {"Request_id": "1"}
+
+def test_retried_requests_share_one_pipeline_run():
+    import asyncio
+    from src.event_loop import run_sync
+    import src.main as main
+
+    runs = []
+    async def fake_pipeline(data):
+        runs.append(data["Request_id"])
+        await asyncio.sleep(0.1)
+        if data.get("fail"):
+            raise RuntimeError("LLM down")
+        return {"Request_id": data["Request_id"], "run": len(runs)}
+
+    data = {"Request_id": "7", "Subject": "Sync", "EmailContent": "Tuesday at 4 pm"}
+    reordered = {"EmailContent": "Tuesday at 4 pm", "Subject": "Sync", "Request_id": "7"}
+    saved = main.run_meeting_assistant, main.response_cache
+    main.run_meeting_assistant = fake_pipeline
+    main.response_cache = main.ResponseCache(ttl_secs=60, max_entries=2)
+    try:
+        async def concurrent():
+            return await asyncio.gather(main.handle_meeting_request(data),
+                                        main.handle_meeting_request(reordered))
+        first, second = run_sync(concurrent())
+        # The in-flight duplicate waited for the first run; a later retry is cached
+        assert first is second and runs == ["7"]
+        assert main.your_meeting_assistant(data) is first and runs == ["7"]
+
+        # Same Request_id with a different payload is a different request
+        assert main.your_meeting_assistant(dict(data, Subject="Other"))["run"] == 2
+        # Failures are not cached; making room for them evicted the oldest entry
+        for _ in range(2):
+            try:
+                main.your_meeting_assistant(dict(data, fail=True))
+            except RuntimeError:
+                pass
+        assert runs == ["7"] * 4
+        assert list(main.response_cache.entries) == [main.request_cache_key(dict(data, Subject="Other"))]
+
+        main.response_cache.ttl_secs = 0
+        main.your_meeting_assistant(dict(data, Subject="Fourth"))
+        main.your_meeting_assistant(dict(data, Subject="Fourth"))
+        assert len(runs) == 6
+    finally:
+        main.run_meeting_assistant, main.response_cache = saved
+
+def test_requests_share_background_loop():
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from src.event_loop import run_sync
+    from src.asgi import app
+
+    in_flight = []
+
+    async def wait_for_all():
+        while len(in_flight) < 8:
+            await asyncio.sleep(0.01)
+
+    async def request(n):
+        in_flight.append(n)
+        # Only returns once all eight are waiting on the loop at once
+        await asyncio.wait_for(wait_for_all(), 5)
+        return asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(8) as pool:
+        loops = list(pool.map(lambda n: run_sync(request(n)), range(8)))
+    assert len(set(map(id, loops))) == 1 and loops[0].is_running()
+    assert sorted(in_flight) == list(range(8))
+
+    async def call(method, path):
+        sent = []
+        async def receive():
+            return {"type": "http.request", "body": b""}
+        async def send(message):
+            sent.append(message)
+        await app({"type": "http", "method": method, "path": path}, receive, send)
+        return sent[0]["status"], sent[1]["body"]
+
+    status, body = run_sync(call("GET", "/metrics"))
+    assert status == 200 and b"meeting_assistant_stage_seconds" in body
+    assert run_sync(call("GET", "/missing"))[0] == 404
+    assert run_sync(call("GET", "/receive"))[0] == 405
+    assert run_sync(call("POST", "/receive"))[0] == 400
+
+def test_long_lived_agents_take_reference_datetime_at_run_time():
+    from pydantic_ai import capture_run_messages
+    from pydantic_ai.models.test import TestModel
+    from src.event_loop import run_sync
+    from src.input_parser_agent import parser_agent, process_meeting_request
+    import src.llm as llm
+
+    output = {"START_TIME": "2025-07-22 16:00:00", "END_TIME": "2025-07-22 17:00:00",
+              "SUMMARY": "Review", "PRIORITY": "2"}
+    data = {"Subject": "Review", "EmailContent": "Tuesday at 4 pm",
+            "Datetime": "19-07-2025T12:34:55"}
+    with parser_agent.override(model=TestModel(call_tools=[], custom_output_args=output)):
+        prompts = []
+        for reference in ("19-07-2025T12:34:55", "20-07-2025T08:00:00"):
+            with capture_run_messages() as messages:
+                summary = run_sync(process_meeting_request(dict(data, Datetime=reference)))
+            assert summary.START_TIME == "2025-07-22 16:00:00"
+            prompts.append("\n".join(part.content for part in messages[0].parts
+                                     if part.part_kind == "system-prompt"))
+    assert "Current datetime: 2025-07-19 12:34:55" in prompts[0] and "Saturday" in prompts[0]
+    assert "Current datetime: 2025-07-20 08:00:00" in prompts[1] and "Sunday" in prompts[1]
+    # The static instructions come first, so both requests share that prefix
+    static_prefix = prompts[0][:prompts[0].index("REFERENCE INFORMATION")]
+    assert "CRITICAL TOOL USAGE RULES" in static_prefix and prompts[1].startswith(static_prefix)
+
+    with llm._warm_up_agent.override(model=TestModel()):
+        assert run_sync(llm.warm_up())
+
+def test_local_datetime_parser_skips_the_parser_agent():
+    from datetime import datetime
+    from pydantic_ai.models.test import TestModel
+    from src.datetime_parser import parse_meeting_time
+    from src.event_loop import run_sync
+    from src.input_parser_agent import get_new_event, parser_agent
+
+    saturday = datetime(2025, 7, 19, 12, 34, 55)
+    parse = lambda text: parse_meeting_time(text, saturday)
+    assert parse("Tuesday at 4 pm") == (datetime(2025, 7, 22, 16), datetime(2025, 7, 22, 17))
+    assert parse("tomorrow morning for 30 minutes") == (datetime(2025, 7, 20, 9), datetime(2025, 7, 20, 9, 30))
+    assert parse("on the 17th, afternoon") == (datetime(2025, 8, 17, 14), datetime(2025, 8, 17, 15))
+    assert parse("Jan 5 from 3-4:30pm") == (datetime(2026, 1, 5, 15), datetime(2026, 1, 5, 16, 30))
+    assert parse("Thursday evening for an hour and a half") == (datetime(2025, 7, 24, 18),
+                                                               datetime(2025, 7, 24, 19, 30))
+    # Ambiguous or unfamiliar phrasings are left to the agent
+    for text in ("Tuesday or Wednesday at 4 pm", "sometime next week", "tomorrow at 5",
+                 "Tuesday from 10 to 11", "tomorrow before 3pm", "Let's catch up soon"):
+        assert parse(text) is None, text
+
+    data = {"From": "a@x.com", "Attendees": [{"email": "b@x.com"}], "Datetime": "19-07-2025T12:34:55",
+            "Subject": "Interview with candidate", "EmailContent": "Tuesday at 4 pm for 30 minutes"}
+    agent_output = {"START_TIME": "2025-07-23 10:00:00", "END_TIME": "2025-07-23 11:00:00",
+                    "SUMMARY": "Agent summary", "PRIORITY": "3"}
+    model = TestModel(call_tools=[], custom_output_args=agent_output)
+    with parser_agent.override(model=model):
+        event = run_sync(get_new_event(data))
+        assert model.last_model_request_parameters is None
+        assert (event.start_time, event.end_time) == (datetime(2025, 7, 22, 16), datetime(2025, 7, 22, 16, 30))
+        assert event.summary == "Interview with candidate" and event.priority == 1.5
+        assert event.attendees == ["b@x.com", "a@x.com"]
+
+        event = run_sync(get_new_event(dict(data, EmailContent="Tuesday or Wednesday works")))
+        assert event.summary == "Agent summary" and event.start_time == datetime(2025, 7, 23, 10)
+
 if __name__ == "__main__":
     test_insert_and_search()
     test_edge_overlaps()
     test_inorder_structure()
     test_max_field_propagation()
+    test_priority_cache()
+    test_priority_rules_send_only_uncertain_summaries_to_llm()
+    test_priority_chunks_run_concurrently_and_retry_alone()
+    test_concurrent_calendar_fetch_against_fake_endpoint()
+    test_calendar_fetch_deadline_skips_trickling_users()
+    test_incremental_calendar_sync()
+    test_pipeline_stages_run_concurrently()
+    test_meeting_assistant_pipeline()
+    test_requests_route_to_per_team_shards()
+    test_meetings_organised_outside_the_shard_block_their_attendees()
+    test_output_shares_event_records_and_streams_json()
+    test_retried_requests_share_one_pipeline_run()
+    test_requests_share_background_loop()
+    test_long_lived_agents_take_reference_datetime_at_run_time()
+    test_local_datetime_parser_skips_the_parser_agent()
     print("All tests passed.")
\ No newline at end of file